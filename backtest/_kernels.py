@@ -0,0 +1,70 @@
+# backtest/_kernels.py
+"""
+Compiled loops behind backtest.metrics' event detection and matching.
+Signatures use plain NumPy arrays so numba can type them; metrics.py
+only calls into here when core._jit.HAVE_NUMBA is set.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+from core._jit import njit
+
+
+@njit(cache=True)
+def pred_indices(
+    scores: np.ndarray, threshold: float, cooldown: int, min_consec: int
+) -> np.ndarray:
+    """Threshold + debounce + cooldown state machine; int64 firing indices."""
+    n = scores.shape[0]
+    out = np.empty(n, dtype=np.int64)
+    k = 0
+    above = 0
+    cool = 0
+    cd = cooldown if cooldown > 0 else 0
+    for i in range(n):
+        if cool > 0:
+            cool -= 1
+        if scores[i] >= threshold:
+            above += 1
+        else:
+            above = 0
+        if above >= min_consec and cool == 0:
+            out[k] = i
+            k += 1
+            cool = cd
+            above = 0
+    return out[:k]
+
+
+@njit(cache=True)
+def match_events(
+    true_idx: np.ndarray, pred_idx: np.ndarray, tol: int
+) -> tuple[int, int, int, np.ndarray]:
+    """Greedy ±tol matching over ascending indices; (tp, fp, fn, int64 delays)."""
+    n_true = true_idx.shape[0]
+    claimed = np.zeros(n_true, dtype=np.bool_)
+    delays = np.empty(pred_idx.shape[0], dtype=np.int64)
+    lo = 0
+    tp = 0
+    fp = 0
+    for p in pred_idx:
+        while lo < n_true and (true_idx[lo] < p - tol or claimed[lo]):
+            lo += 1
+        best_k = -1
+        best_abs = tol + 1
+        k = lo
+        while k < n_true and true_idx[k] <= p + tol:
+            if not claimed[k]:
+                a = abs(p - true_idx[k])
+                if a < best_abs:
+                    best_abs = a
+                    best_k = k
+            k += 1
+        if best_k < 0:
+            fp += 1
+        else:
+            claimed[best_k] = True
+            delays[tp] = p - true_idx[best_k]
+            tp += 1
+    return tp, fp, n_true - tp, delays[:tp]
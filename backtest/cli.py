@@ -3,14 +3,23 @@ from __future__ import annotations
 
 import argparse
 import json
+import math
 import sys
+from collections.abc import Iterable, Iterator
 from pathlib import Path
-from typing import Any, Iterable, Iterator
+from typing import Any
+
+import numpy as np
 
 # Local imports
-from backtest.runner import BacktestRunner
+from backtest import tick_cache
+from backtest.runner import BacktestLog, BacktestRunner
 from core.config import load_config
 from core.pipeline import Pipeline
+from data.replay import ArrayStream
+
+# Columns _stream_from_df reads; anything else in the file is never touched.
+_STREAM_COLUMNS = ("x", "timestamp", "cp", "is_cp")
 
 
 def _read_dataframe(path: Path):
@@ -26,75 +35,195 @@ def _read_dataframe(path: Path):
         ) from e
 
     if path.suffix.lower() in {".parquet", ".pq"}:
-        return pd.read_parquet(path)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ModuleNotFoundError:
+            return pd.read_parquet(path, memory_map=True)
+        # map the file so pages come straight from the OS page cache
+        pf = pq.ParquetFile(pa.memory_map(str(path), "r"))
+        names = pf.schema_arrow.names
+        # only decode the columns the stream uses; read everything if 'x' is
+        # missing so the caller's error message can list what is there
+        cols = [c for c in _STREAM_COLUMNS if c in names] if "x" in names else None
+        return pf.read(columns=cols).to_pandas(self_destruct=True)
     # default to CSV; let pandas infer
-    return pd.read_csv(path)
+    return pd.read_csv(path, memory_map=True)
 
 
-def _stream_from_df(df) -> Iterator[dict[str, Any]]:
+def _stream_from_df(df) -> Iterable[dict[str, Any]]:
     """
     Turn a DataFrame into a stream of ticks expected by the Pipeline.
     Columns:
       - x (required): float target per tick (e.g., log return)
-      - timestamp (optional): included verbatim if present
+      - timestamp (optional): passed through verbatim
       - cp or is_cp (optional): ground-truth CP flag (0/1)
+
+    Prefers a column-backed ArrayStream; frames whose columns won't convert
+    cleanly fall back to row tuples.
     """
-    # prefer vectorized access, but iterrows is fine
-    has_ts = "timestamp" in df.columns
-    has_cp = "cp" in df.columns or "is_cp" in df.columns
+    import pandas as pd
+
     cp_col = "cp" if "cp" in df.columns else ("is_cp" if "is_cp" in df.columns else None)
 
-    for i, row in df.iterrows():
-        tick: dict[str, Any] = {"x": float(row["x"])}
+    # resolve each column once as a NumPy array; no per-row Series
+    try:
+        x = df["x"].to_numpy(dtype=np.float64, copy=False)
+    except (TypeError, ValueError):
+        return _rows_from_df(df, cp_col)
+    ts = df["timestamp"].to_numpy(copy=False) if "timestamp" in df.columns else None
+    cp = None
+    if cp_col is not None:
+        # Ensure numeric 0/1; anything unparseable counts as 0.0
+        cp = pd.to_numeric(df[cp_col], errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+    return ArrayStream(x=x, ts=ts, cp=cp)
+
+
+def _rows_from_df(df, cp_col: str | None) -> Iterator[dict[str, Any]]:
+    """Row-oriented fallback: plain tuples via itertuples, converted per tick."""
+    has_ts = "timestamp" in df.columns
+    cols = ["x"] + (["timestamp"] if has_ts else []) + ([cp_col] if cp_col else [])
+    for row in df[cols].itertuples(index=False, name=None):
+        tick: dict[str, Any] = {"x": float(row[0])}
         if has_ts:
-            tick["timestamp"] = row["timestamp"]
-        if has_cp and cp_col is not None:
-            # Ensure numeric 0/1
+            tick["timestamp"] = row[1]
+        if cp_col is not None:
             try:
-                tick["cp"] = float(row[cp_col])
+                tick["cp"] = float(row[-1])
             except Exception:
                 tick["cp"] = 0.0
         yield tick
 
 
-def _build_stream(data_path: str) -> Iterable[dict[str, Any]]:
+def _build_stream(data_path: str, cache_path: str | None = None) -> Iterable[dict[str, Any]]:
+    """
+    Stream for `data_path`. With `cache_path` the binary tick cache is mapped
+    instead of re-parsing the file, and (re)written first when stale or
+    missing; frames the cache can't hold exactly are streamed uncached.
+    """
     p = Path(data_path)
     if not p.is_file():
         raise FileNotFoundError(f"--data not found: {p}")
+    if cache_path and tick_cache.is_fresh(cache_path, p):
+        return tick_cache.open_binary(cache_path)
     df = _read_dataframe(p)
     if "x" not in df.columns:
         raise ValueError(f"--data must include an 'x' column, got columns: {list(df.columns)}")
+    if cache_path:
+        try:
+            return tick_cache.open_binary(tick_cache.to_binary(df, cache_path, source=p))
+        except ValueError as e:
+            print(f"--cache: {e}", file=sys.stderr)
     return _stream_from_df(df)
 
 
+def run_backtest(
+    pipe: Pipeline,
+    data: str,
+    *,
+    alpha: float = 0.1,
+    cp_tol: int = 10,
+    cp_threshold: float | None = None,
+    cp_cooldown: int | None = None,
+    exact_latency: bool = True,
+    time_every: int = 1,
+    cache: str | None = None,
+) -> tuple[dict[str, float], BacktestLog]:
+    """Build the stream for `data` and backtest `pipe` on it (shared by main and --serve)."""
+    stream = _build_stream(data, cache)
+    runner = BacktestRunner(
+        alpha=alpha,
+        cp_tol=cp_tol,
+        cp_threshold=cp_threshold,
+        cp_cooldown=cp_cooldown,
+        exact_latency=exact_latency,
+        time_every=time_every,
+    )
+    return runner.run(pipe, stream)
+
+
+def _dump_log(log: BacktestLog, path: Path) -> None:
+    """Write the log as CSV, or column-oriented JSON for a .json path."""
+    import pandas as pd
+
+    cols: dict[str, Any] = log.columns()
+    if path.suffix.lower() == ".json":
+        if cols["t"].dtype.kind == "M":
+            cols["t"] = np.datetime_as_string(cols["t"])
+        path.write_bytes(_log_json(cols))
+        return
+    pd.DataFrame(cols).to_csv(path, index=False)
+
+
+def _log_json(cols: dict[str, np.ndarray]) -> bytes:
+    """
+    Indented JSON for the log columns; non-finite floats become null. orjson
+    (when installed) writes the float columns straight from the arrays.
+    """
+    try:
+        import orjson
+    except ModuleNotFoundError:
+        out = {
+            k: [v if math.isfinite(v) else None for v in c.tolist()] if c.dtype.kind == "f" else c.tolist()
+            for k, c in cols.items()
+        }
+        return json.dumps(out, indent=2, ensure_ascii=False, default=str).encode("utf-8")
+    out = {k: (c.tolist() if c.dtype == object or c.dtype.kind == "U" else c) for k, c in cols.items()}
+    return orjson.dumps(out, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+
+
 def main() -> int:
     ap = argparse.ArgumentParser()
-    ap.add_argument("--data", required=True, help="CSV/Parquet file containing at least column 'x'.")
+    ap.add_argument("--data", help="CSV/Parquet file containing at least column 'x' (required unless --serve).")
     ap.add_argument("--alpha", type=float, default=0.1, help="Target miscoverage alpha (e.g., 0.1 → 90% PI).")
     ap.add_argument("--cp_tol", type=int, default=10, help="Change-point matching tolerance in ticks.")
     ap.add_argument("--cp-threshold", "--cp_threshold", dest="cp_threshold", type=float, default=None,
                     help="Detector score threshold for counting a CP event (optional).")
     ap.add_argument("--cp-cooldown", "--cp_cooldown", dest="cp_cooldown", type=int, default=None,
                     help="Minimum ticks between CP events (optional).")
+    ap.add_argument("--approx-latency", action="store_true",
+                    help="Estimate p50/p95 latency with streaming P² in O(1) memory instead of "
+                         "keeping every sample (marked by latency_approx in the metrics).")
+    ap.add_argument("--time-every", "--time_every", dest="time_every", type=int, default=1,
+                    help="Time only every K-th prediction for the latency metrics (default: all).")
+    ap.add_argument("--dump-log", dest="dump_log",
+                    help="Also write the per-prediction log to this path (.json for JSON, else CSV).")
+    ap.add_argument("--cache", help="Binary tick cache (.tvc); written from --data on first use, mapped after.")
     ap.add_argument("--profile", choices=["sim", "market"], help="Config profile to load.")
     ap.add_argument("--config", help="Path to a YAML config file.")
+    ap.add_argument("--serve", action="store_true",
+                    help="Worker mode: read JSON requests from stdin, one result line each on stdout.")
     args = ap.parse_args()
 
+    if args.serve:
+        from backtest.cli_server import serve
+
+        # flags given on the command line become per-request defaults
+        defaults = {k: v for k, v in vars(args).items() if k not in {"serve", "dump_log"} and v is not None}
+        serve(sys.stdin, sys.stdout, defaults)
+        return 0
+    if not args.data:
+        ap.error("--data is required (or use --serve)")
+
     # Resolve configuration (explicit path > env > profile > default)
     cfg = load_config(args.config, args.profile) or {}
 
-    # Build pipeline and data stream
+    # Build pipeline, then run the backtest over the data stream
     pipe = Pipeline(cfg)
-    stream = _build_stream(args.data)
-
-    # Run backtest
-    runner = BacktestRunner(
+    metrics, log = run_backtest(
+        pipe,
+        args.data,
         alpha=args.alpha,
         cp_tol=args.cp_tol,
         cp_threshold=args.cp_threshold,
         cp_cooldown=args.cp_cooldown,
+        exact_latency=not args.approx_latency,
+        time_every=args.time_every,
+        cache=args.cache,
     )
-    metrics, log = runner.run(pipe, stream)
+
+    if args.dump_log:
+        _dump_log(log, Path(args.dump_log))
 
     # Emit concise JSON (no giant log dump by default)
     out = {
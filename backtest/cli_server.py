@@ -0,0 +1,112 @@
+# backtest/cli_server.py
+"""
+Long-lived backtest worker for sweeps: `python -m backtest.cli --serve`.
+
+Reads one JSON request per line on stdin and writes one JSON result per line
+on stdout, so imports, YAML parsing and Pipeline construction are paid once
+instead of per run. Request keys mirror the CLI flags:
+
+  {"data": "...", "alpha": 0.1, "cp_tol": 10, "cp_threshold": null,
+   "cp_cooldown": null, "profile": null, "config": null, "cache": null, "id": ...}
+
+Only "data" is required; "id" is echoed back. Failures are reported as
+{"error": "..."} and the worker keeps going.
+"""
+from __future__ import annotations
+
+import json
+import math
+from typing import Any, TextIO
+
+from core.config import load_config
+from core.pipeline import Pipeline
+
+ConfigKey = tuple[str | None, str | None]
+
+# pipelines keyed by (config_path, profile), with the config each was built from
+_PIPELINES: dict[ConfigKey, tuple[dict[str, Any], Pipeline]] = {}
+
+
+def cached_pipeline(config: str | None, profile: str | None) -> Pipeline:
+    """
+    One Pipeline per config, reset to a fresh state on every checkout. The
+    config is re-resolved each time (load_config only re-parses edited
+    files), and a changed config gets a newly built Pipeline.
+    """
+    key = (config, profile)
+    cfg = load_config(config, profile) or {}
+    hit = _PIPELINES.get(key)
+    if hit is not None and hit[0] == cfg:
+        pipe = hit[1]
+        pipe.reset()
+    else:
+        pipe = Pipeline(cfg)
+        _PIPELINES[key] = (cfg, pipe)
+    return pipe
+
+
+def handle(req: dict[str, Any], defaults: dict[str, Any] | None = None) -> dict[str, Any]:
+    """Run one backtest request; keys missing from `req` come from `defaults`."""
+    from backtest.cli import run_backtest
+
+    opts = {**(defaults or {}), **req}
+    if not opts.get("data"):
+        raise ValueError("request needs a 'data' path")
+    pipe = cached_pipeline(opts.get("config"), opts.get("profile"))
+    metrics, log = run_backtest(
+        pipe,
+        str(opts["data"]),
+        alpha=float(opts.get("alpha", 0.1)),
+        cp_tol=int(opts.get("cp_tol", 10)),
+        cp_threshold=opts.get("cp_threshold"),
+        cp_cooldown=opts.get("cp_cooldown"),
+        exact_latency=not opts.get("approx_latency", False),
+        time_every=int(opts.get("time_every", 1)),
+        cache=opts.get("cache"),
+    )
+    return {"metrics": metrics, "n_points": len(log)}
+
+
+def _json_line(res: dict[str, Any]) -> str:
+    """One response line; orjson when installed. NaN/inf are written as null either way."""
+    try:
+        import orjson
+    except ModuleNotFoundError:
+        return json.dumps(_nonfinite_to_none(res), ensure_ascii=False) + "\n"
+    return orjson.dumps(res, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE).decode()
+
+
+def _nonfinite_to_none(obj: Any) -> Any:
+    """What orjson does with non-finite floats, for the stdlib fallback."""
+    if isinstance(obj, dict):
+        return {k: _nonfinite_to_none(v) for k, v in obj.items()}
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    return obj
+
+
+def serve(
+    inp: TextIO, out: TextIO, defaults: dict[str, Any] | None = None
+) -> int:
+    """Answer requests from `inp` until EOF; returns the number of failed requests."""
+    failures = 0
+    for line in inp:
+        line = line.strip()
+        if not line:
+            continue
+        req_id = None
+        try:
+            req = json.loads(line)
+            if not isinstance(req, dict):
+                raise ValueError("request must be a JSON object")
+            req_id = req.pop("id", None)
+            res = handle(req, defaults)
+        except Exception as e:
+            failures += 1
+            res = {"error": f"{type(e).__name__}: {e}"}
+        if req_id is not None:
+            res["id"] = req_id
+        out.write(_json_line(res))
+        # one flush per answer: the caller is waiting on this line
+        out.flush()
+    return failures
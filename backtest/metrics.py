@@ -4,79 +4,219 @@ import math
 from collections.abc import Sequence
 from typing import Any
 
+import numpy as np
 
-def _pair_count(xs: Sequence[float], ys: Sequence[float]) -> int:
-    """Number of elementwise pairs that will be compared (min lengths)."""
-    return min(len(xs), len(ys))
+from core._jit import HAVE_NUMBA
 
+from . import _kernels
 
-def mae(y_true: Sequence[float], y_pred: Sequence[float]) -> float:
+# plain sequences or NumPy arrays; metrics convert once via np.asarray
+FloatSeq = Sequence[float] | np.ndarray
+
+
+def _as_arrays(*seqs: FloatSeq) -> list[np.ndarray]:
+    """float64 views of the inputs, truncated to the shortest (no copy for arrays)."""
+    arrs = [np.asarray(s, dtype=np.float64) for s in seqs]
+    n = min(a.size for a in arrs)
+    return [a[:n] for a in arrs]
+
+
+def mae(y_true: FloatSeq, y_pred: FloatSeq) -> float:
     """
     Mean Absolute Error over available pairs. Returns NaN if no pairs.
     """
-    n = _pair_count(y_true, y_pred)
-    if n == 0:
+    a, b = _as_arrays(y_true, y_pred)
+    if a.size == 0:
         return float("nan")
-    s = 0.0
-    for a, b in zip(y_true, y_pred, strict=False):
-        s += abs(a - b)
-    return s / n
+    return float(np.mean(np.abs(a - b)))
 
 
-def rmse(y_true: Sequence[float], y_pred: Sequence[float]) -> float:
+def rmse(y_true: FloatSeq, y_pred: FloatSeq) -> float:
     """
     Root Mean Squared Error over available pairs. Returns NaN if no pairs.
     """
-    n = _pair_count(y_true, y_pred)
-    if n == 0:
+    a, b = _as_arrays(y_true, y_pred)
+    if a.size == 0:
         return float("nan")
-    ss = 0.0
-    for a, b in zip(y_true, y_pred, strict=False):
-        d = a - b
-        ss += d * d
-    return math.sqrt(ss / n)
+    d = a - b
+    return math.sqrt(float(np.dot(d, d)) / d.size)
 
 
-def smape(y_true: Sequence[float], y_pred: Sequence[float]) -> float:
+def smape(y_true: FloatSeq, y_pred: FloatSeq) -> float:
     """
     Symmetric MAPE in percent. 0 if denominator is 0 for all pairs.
     """
-    num = 0.0
-    den = 0.0
-    for a, f in zip(y_true, y_pred, strict=False):
-        num += abs(f - a)
-        den += (abs(a) + abs(f)) / 2.0
+    a, f = _as_arrays(y_true, y_pred)
+    num = float(np.abs(f - a).sum())
+    den = float((np.abs(a) + np.abs(f)).sum()) / 2.0
     return (num / den) * 100.0 if den > 0 else 0.0
 
 
-def coverage(y_true: Sequence[float], lo: Sequence[float], hi: Sequence[float]) -> float:
+def coverage(y_true: FloatSeq, lo: FloatSeq, hi: FloatSeq) -> float:
     """
     Fraction of truths that lie within [lo, hi]. 0.0 if no pairs.
     """
-    hit = 0
-    total = 0
-    for y, ql, qh in zip(y_true, lo, hi, strict=False):
-        total += 1
-        if ql <= y <= qh:
-            hit += 1
-    return hit / total if total else 0.0
+    y, ql, qh = _as_arrays(y_true, lo, hi)
+    if y.size == 0:
+        return 0.0
+    return np.count_nonzero((ql <= y) & (y <= qh)) / y.size
+
+
+# below this many pairs thread start-up costs more than the reductions save
+PARALLEL_MIN_POINTS = 1_000_000
+
+
+def _error_sums(y: np.ndarray, f: np.ndarray) -> tuple[float, float]:
+    """(sum |y - f|, sum (y - f)^2) from one difference array, reused in place."""
+    d = np.subtract(y, f)
+    sq = float(np.dot(d, d))
+    np.abs(d, out=d)
+    return float(d.sum()), sq
+
+
+def _scale_sum(y: np.ndarray, f: np.ndarray) -> float:
+    """sum(|y| + |f|), the sMAPE denominator (times two)."""
+    s = np.abs(y)
+    s += np.abs(f)
+    return float(s.sum())
+
+
+def _inside_count(y: np.ndarray, ql: np.ndarray, qh: np.ndarray) -> int:
+    return int(np.count_nonzero((ql <= y) & (y <= qh)))
+
+
+def point_metrics(
+    y_true: FloatSeq, y_pred: FloatSeq, lo: FloatSeq, hi: FloatSeq
+) -> dict[str, float]:
+    """
+    mae / rmse / smape / coverage in one call, equal to the four helpers.
+    y - f is materialized once and shared by mae, rmse and the sMAPE
+    numerator. On large inputs the three passes run on a small thread pool:
+    NumPy drops the GIL inside each, and free-threaded builds overlap fully.
+    """
+    y, f, ql, qh = _as_arrays(y_true, y_pred, lo, hi)
+    n = y.size
+    if n < PARALLEL_MIN_POINTS:
+        (abs_sum, sq_sum), scale, inside = _error_sums(y, f), _scale_sum(y, f), _inside_count(y, ql, qh)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=3) as ex:
+            errs = ex.submit(_error_sums, y, f)
+            scl = ex.submit(_scale_sum, y, f)
+            ins = ex.submit(_inside_count, y, ql, qh)
+            (abs_sum, sq_sum), scale, inside = errs.result(), scl.result(), ins.result()
+    if n == 0:
+        return {"mae": float("nan"), "rmse": float("nan"), "smape": 0.0, "coverage": 0.0}
+    den = scale / 2.0
+    return {
+        "mae": abs_sum / n,
+        "rmse": math.sqrt(sq_sum / n),
+        "smape": (abs_sum / den) * 100.0 if den > 0 else 0.0,
+        "coverage": inside / n,
+    }
 
 
-def latency_p50_p95(latencies_ms: Sequence[float]) -> dict[str, float]:
+def latency_p50_p95(latencies_ms: FloatSeq, *, overwrite_input: bool = False) -> dict[str, float]:
     """
     p50 / p95 of latencies using simple order statistics. Returns zeros if empty.
+    Both order statistics come from one np.partition (linear-time selection).
+    With overwrite_input=True a float64 array is partitioned in place, saving
+    the copy (as in np.percentile); its order is then unspecified.
     """
-    if not latencies_ms:
+    arr = np.asarray(latencies_ms, dtype=np.float64)
+    n = arr.size
+    if n == 0:
         return {"p50": 0.0, "p95": 0.0}
-    xs = sorted(latencies_ms)
-    n = len(xs)
-    p50 = xs[int(0.5 * (n - 1))]
-    p95 = xs[int(0.95 * (n - 1))]
-    return {"p50": float(p50), "p95": float(p95)}
+    k50 = int(0.5 * (n - 1))
+    k95 = int(0.95 * (n - 1))
+    if overwrite_input:
+        arr.partition([k50, k95])
+        part = arr
+    else:
+        part = np.partition(arr, [k50, k95])
+    return {"p50": float(part[k50]), "p95": float(part[k95])}
 
 
-def _indices_from_flags(flags: Sequence[int]) -> list[int]:
-    return [i for i, f in enumerate(flags) if int(f) == 1]
+class P2Estimator:
+    """
+    Online quantile estimate in O(1) memory (Jain & Chlamtac P² algorithm).
+
+    Tracks five markers whose heights converge on the p-quantile. Up to five
+    samples the answer is the exact order statistic, picked like
+    latency_p50_p95 does; value() is 0.0 before any sample.
+    """
+
+    __slots__ = ("p", "count", "_q", "_n", "_np", "_dn")
+
+    def __init__(self, p: float) -> None:
+        if not 0.0 < p < 1.0:
+            raise ValueError("p must be in (0, 1)")
+        self.p = float(p)
+        self.count = 0
+        self._q: list[float] = []
+        self._n = [0, 1, 2, 3, 4]
+        self._np = [0.0, 2.0 * p, 4.0 * p, 2.0 + 2.0 * p, 4.0]
+        self._dn = [0.0, p / 2.0, p, (1.0 + p) / 2.0, 1.0]
+
+    def add(self, x: float) -> None:
+        x = float(x)
+        self.count += 1
+        q, n = self._q, self._n
+        if self.count <= 5:
+            q.append(x)
+            if self.count == 5:
+                q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        npos, dn = self._np, self._dn
+        for i in range(5):
+            npos[i] += dn[i]
+
+        for i in (1, 2, 3):
+            d = npos[i] - n[i]
+            if (d >= 1.0 and n[i + 1] - n[i] > 1) or (d <= -1.0 and n[i - 1] - n[i] < -1):
+                s = 1 if d > 0 else -1
+                qp = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    # parabola left the bracket; step linearly toward the neighbour
+                    qp = q[i] + s * (q[i + s] - q[i]) / (n[i + s] - n[i])
+                q[i] = qp
+                n[i] += s
+
+    def value(self) -> float:
+        if self.count == 0:
+            return 0.0
+        if self.count <= 5:
+            return float(sorted(self._q)[int(self.p * (self.count - 1))])
+        return float(self._q[2])
+
+
+def _int_flags(flags: Sequence[int] | np.ndarray) -> np.ndarray:
+    """Flags truncated to int64 like int(f); NaN/inf are rejected as int() would."""
+    arr = np.asarray(flags, dtype=np.float64)
+    if not np.isfinite(arr).all():
+        raise ValueError("cp flags must be finite")
+    return arr.astype(np.int64)
+
+
+def _indices_from_flags(flags: Sequence[int] | np.ndarray) -> list[int]:
+    return np.flatnonzero(_int_flags(flags) == 1).tolist()
 
 
 def _match_events(
@@ -85,35 +225,50 @@ def _match_events(
     """
     Greedy bipartite matching with ±tol window.
     Returns (tp, fp, fn, delays_of_tp) where delay = pred_index - true_index (can be negative).
+
+    Both index lists are ascending, so each prediction only looks at the true
+    indices inside [p - tol, p + tol]; `lo` never moves backwards.
     """
-    used_true: set[int] = set()
+    if HAVE_NUMBA:
+        tp, fp, fn, d = _kernels.match_events(
+            np.asarray(true_idx, dtype=np.int64), np.asarray(pred_idx, dtype=np.int64), int(tol)
+        )
+        return int(tp), int(fp), int(fn), d.tolist()
+
+    n_true = len(true_idx)
+    claimed = [False] * n_true
+    lo = 0
     tp = 0
     fp = 0
     delays: list[int] = []
 
     for p in pred_idx:
-        cand: tuple[int, int] | None = None
+        # true events left of the window can't match this or any later prediction
+        while lo < n_true and (true_idx[lo] < p - tol or claimed[lo]):
+            lo += 1
+        best_k = -1
         best_abs = tol + 1
-        for t in true_idx:
-            if t in used_true:
-                continue
-            d = p - t
-            if -tol <= d <= tol and abs(d) < best_abs:
-                best_abs = abs(d)
-                cand = (t, d)
-        if cand is None:
+        k = lo
+        while k < n_true and true_idx[k] <= p + tol:
+            if not claimed[k]:
+                a = abs(p - true_idx[k])
+                if a < best_abs:  # strict: ties go to the earlier true index
+                    best_abs = a
+                    best_k = k
+            k += 1
+        if best_k < 0:
             fp += 1
         else:
-            used_true.add(cand[0])
+            claimed[best_k] = True
             tp += 1
-            delays.append(cand[1])
+            delays.append(p - true_idx[best_k])
 
-    fn = len(true_idx) - len(used_true)
+    fn = n_true - tp
     return tp, fp, fn, delays
 
 
 def _pred_indices_from_scores(
-    scores: Sequence[float],
+    scores: FloatSeq,
     threshold: float,
     cooldown: int,
     min_consecutive: int = 1,
@@ -122,27 +277,42 @@ def _pred_indices_from_scores(
     Threshold + debounce + cooldown.
     Fires at the first index of a run of >= min_consecutive scores above threshold,
     then enforces a cooldown gap of exactly `cooldown` subsequent indices.
+
+    Index i can fire when the run of above-threshold scores ending at i is at
+    least min_consecutive long, so candidates come from one vectorized pass.
+    After a fire at j the run counter restarts and the cooldown starts, so the
+    next fire is the first candidate at or after j + max(min_consecutive, cooldown, 1).
     """
-    preds: list[int] = []
-    above = 0
-    cool = 0
-    for i, s in enumerate(scores):
-        if cool > 0:
-            cool -= 1
-        if s >= threshold:
-            above += 1
+    s = np.asarray(scores, dtype=np.float64)
+    mc = int(min_consecutive)
+    if HAVE_NUMBA:
+        return _kernels.pred_indices(s, float(threshold), int(cooldown), mc).tolist()
+    if mc <= 0:
+        cand = np.arange(s.size)
+    else:
+        mask = s >= threshold
+        if mc == 1:
+            cand = np.flatnonzero(mask)
         else:
-            above = 0
-        if above >= min_consecutive and cool == 0:
-            preds.append(i)
-            cool = max(cooldown, 0)
-            above = 0
+            run = np.cumsum(mask, dtype=np.intp)
+            run[mc:] -= run[:-mc].copy()
+            cand = np.flatnonzero(run >= mc)
+    if cand.size == 0:
+        return []
+
+    gap = max(mc, int(cooldown), 1)
+    preds: list[int] = []
+    k = 0
+    while k < cand.size:
+        j = int(cand[k])
+        preds.append(j)
+        k = int(np.searchsorted(cand, j + gap, side="left"))
     return preds
 
 
 def detection_metrics(
-    true_flags: Sequence[int] | None,
-    scores: Sequence[float],
+    true_flags: Sequence[int] | np.ndarray | None,
+    scores: FloatSeq,
     threshold: float,
     cooldown: int,
     tol: int,
@@ -161,7 +331,8 @@ def detection_metrics(
         "cp_chatter_per_1000": float(chatter),
     }
 
-    no_true = (not true_flags) or (sum(int(f) for f in true_flags) == 0)
+    flags = _int_flags(true_flags) if true_flags is not None else None
+    no_true = flags is None or flags.size == 0 or int(flags.sum()) == 0
     if no_true:
         far = pred_count / max(n, 1)
         out.update(
@@ -176,10 +347,10 @@ def detection_metrics(
         )
         return out
 
-    # mypy: after no_true is false, we know true_flags is not None
-    assert true_flags is not None
+    # mypy: after no_true is false, we know flags is not None
+    assert flags is not None
 
-    true_idx = _indices_from_flags(true_flags)
+    true_idx = np.flatnonzero(flags == 1).tolist()
     tp, fp, fn, delays = _match_events(true_idx, pred_idx, tol)
 
     prec = tp / max(tp + fp, 1)
@@ -212,12 +383,26 @@ def detection_metrics(
 
 
 def cp_event_metrics(
-    log: list[dict[str, Any]], tol: int, *, threshold: float = 0.5, cooldown: int = 5
+    log: Sequence[dict[str, Any]] | None,
+    tol: int,
+    *,
+    threshold: float = 0.5,
+    cooldown: int = 5,
+    cp_true: np.ndarray | None = None,
+    score: np.ndarray | None = None,
 ) -> dict[str, float]:
     """
     Thin wrapper to compute CP metrics from a backtest log.
-    Expects 'cp_true' and 'score' in each log row.
+    Expects 'cp_true' and 'score' in each log row, unless both are passed
+    directly as aligned arrays (then `log` is ignored and may be None).
     """
-    true_flags = [int(row.get("cp_true", 0.0)) for row in log]
-    scores = [float(row.get("score", 0.0)) for row in log]
-    return detection_metrics(true_flags, scores, threshold=threshold, cooldown=cooldown, tol=tol)
+    if cp_true is None or score is None:
+        rows = log or []
+        if isinstance(getattr(rows, "score", None), np.ndarray):
+            # column-backed log (BacktestLog): use its arrays as-is
+            cp_true, score = rows.cp_true, rows.score  # type: ignore[attr-defined]
+        else:
+            n = len(rows)
+            cp_true = np.fromiter((row.get("cp_true", 0.0) for row in rows), np.float64, count=n)
+            score = np.fromiter((row.get("score", 0.0) for row in rows), np.float64, count=n)
+    return detection_metrics(cp_true, score, threshold=threshold, cooldown=cooldown, tol=tol)
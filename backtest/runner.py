@@ -1,10 +1,18 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, fields
+from functools import partial
+from itertools import chain
 from typing import Any
+import math
 import time
 
-from .metrics import coverage, latency_p50_p95, mae, rmse, smape
+import numpy as np
+
+from data.replay import ArrayStream
+
+from .metrics import P2Estimator, cp_event_metrics, latency_p50_p95, point_metrics
 
 
 def _ingest_truth(pipe, y: float, prediction_id: str | None = None):
@@ -32,6 +40,29 @@ def _predict(pipe, tick: dict[str, Any]) -> dict[str, Any]:
     )
 
 
+def _bind_predict(pipe) -> Callable[[dict[str, Any]], dict[str, Any]]:
+    """_predict with the method lookup done once instead of per tick."""
+    for name in ("process", "predict", "step", "process_tick", "__call__"):
+        if hasattr(pipe, name):
+            return getattr(pipe, name)
+    return partial(_predict, pipe)  # raises the usual AttributeError when called
+
+
+def _bind_truth(pipe) -> Callable[[float], Any]:
+    """_ingest_truth with the method lookup done once instead of per tick."""
+    fn = getattr(pipe, "update_truth", None)
+    if fn is None:
+        return partial(_ingest_truth, pipe)
+
+    def ingest(y: float) -> Any:
+        try:
+            return fn(y=y, prediction_id=None)
+        except TypeError:
+            return fn(y)
+
+    return ingest
+
+
 def _extract_latency_ms(pred: dict[str, Any]) -> float:
     lm = pred.get("latency_ms") or {}
     if isinstance(lm, dict):
@@ -47,8 +78,11 @@ def _extract_latency_ms(pred: dict[str, Any]) -> float:
         return 0.0
 
 
+_YHAT_KEYS = ("y_hat", "yhat", "y_pred", "prediction", "y")
+
+
 def _extract_yhat(pred: dict[str, Any]) -> float:
-    for k in ("y_hat", "yhat", "y_pred", "prediction", "y"):
+    for k in _YHAT_KEYS:
         if k in pred:
             return float(pred[k])
     raise KeyError("Prediction dict missing y_hat/yhat/y_pred/prediction/y")
@@ -71,7 +105,170 @@ def _extract_intervals(pred: dict[str, Any], alpha: float) -> tuple[float, float
     return float(yhat), float(yhat)
 
 
+def _interval_key(iv: dict[Any, Any], alpha: float) -> Any:
+    for k in (f"alpha={alpha:.2f}", f"alpha={alpha}", alpha, str(alpha)):
+        if k in iv:
+            return k
+    return None
+
+
+def _bind_extractors(
+    pred: dict[str, Any], alpha: float
+) -> tuple[
+    Callable[[dict[str, Any]], float],
+    Callable[[dict[str, Any]], tuple[float, float]],
+    Callable[[dict[str, Any]], float],
+]:
+    """
+    Specialize the y_hat / interval / latency extractors to the key layout of
+    the first prediction, so later ticks do one lookup instead of a key scan.
+    Each bound getter falls back to the generic extractor when a prediction
+    doesn't fit that layout, so results never differ from the _extract_* calls.
+    """
+    yk = next((k for k in _YHAT_KEYS if k in pred), "y_hat")
+
+    def get_yhat(p: dict[str, Any]) -> float:
+        try:
+            return float(p[yk])
+        except KeyError:
+            return _extract_yhat(p)
+
+    iv = pred.get("intervals")
+    ik = _interval_key(iv, alpha) if isinstance(iv, dict) else None
+
+    def get_iv_generic(p: dict[str, Any]) -> tuple[float, float]:
+        return _extract_intervals(p, alpha)
+
+    def get_iv_flat(p: dict[str, Any]) -> tuple[float, float]:
+        try:
+            return float(p["interval_low"]), float(p["interval_high"])
+        except KeyError:
+            return _extract_intervals(p, alpha)
+
+    def get_iv_nested(p: dict[str, Any]) -> tuple[float, float]:
+        # flat bounds would win in _extract_intervals, so only use this when absent
+        if "interval_low" in p:
+            return _extract_intervals(p, alpha)
+        try:
+            low, high = p["intervals"][ik]
+        except (KeyError, TypeError):
+            return _extract_intervals(p, alpha)
+        return float(low), float(high)
+
+    if "interval_low" in pred and "interval_high" in pred:
+        get_iv = get_iv_flat
+    elif ik is not None:
+        get_iv = get_iv_nested
+    else:
+        get_iv = get_iv_generic
+
+    def get_lat(p: dict[str, Any]) -> float:
+        # common case: the pipeline reports no latency of its own
+        return _extract_latency_ms(p) if p.get("latency_ms") else 0.0
+
+    return get_yhat, get_iv, get_lat
+
+
+def _tick_rows(stream: Iterable[dict[str, Any]]) -> Iterator[tuple[float, Any, float, Any]]:
+    """
+    (x, timestamp, cp_true, predict_arg) per tick dict; predict_arg is the tick itself.
+    Streams are homogeneous, so the cp field ("cp" or "is_cp") is resolved
+    from the first tick instead of probed on every one.
+    """
+    it = iter(stream)
+    first = next(it, None)
+    if first is None:
+        return
+    cp_field = "cp" if "cp" in first else ("is_cp" if "is_cp" in first else None)
+    ticks = chain((first,), it)
+    if cp_field is None:
+        for tick in ticks:
+            yield float(tick["x"]), tick.get("timestamp"), 0.0, tick
+        return
+    for tick in ticks:
+        yield float(tick["x"]), tick.get("timestamp"), float(tick.get(cp_field) or 0.0), tick
+
+
+def _array_rows(stream: ArrayStream) -> Iterator[tuple[float, Any, float, Any]]:
+    """
+    Rows read straight off the x column; predict_arg is the scalar x. The
+    timestamp and cp slots are placeholders: the runner copies those columns
+    into the log after the loop, so no per-tick objects are built for them.
+    """
+    for x in stream.x.tolist():
+        yield x, None, 0.0, x
+
+
+@dataclass
+class BacktestLog:
+    """
+    Per-prediction backtest log stored column-wise (one array per field).
+
+    Row i scores the prediction made at tick i against the truth at tick i+1.
+    len() and iteration behave like the old list of row dicts, so existing
+    consumers keep working; use columns() to build a DataFrame without
+    going through per-row dicts.
+    """
+
+    t: np.ndarray
+    y: np.ndarray
+    y_hat: np.ndarray
+    ql: np.ndarray
+    qh: np.ndarray
+    regime: np.ndarray
+    score: np.ndarray
+    cp_prob: np.ndarray
+    cp_true: np.ndarray
+    lat_total_ms: np.ndarray
+
+    @classmethod
+    def empty(cls, n: int) -> BacktestLog:
+        obj = {"t", "regime"}
+        return cls(
+            **{
+                f.name: np.empty(n, dtype=object if f.name in obj else np.float64)
+                for f in fields(cls)
+            }
+        )
+
+    def resize(self, n: int) -> None:
+        """Grow (copying existing rows) or trim (as views) every column to n rows."""
+        for f in fields(self):
+            col = getattr(self, f.name)
+            if n <= len(col):
+                setattr(self, f.name, col[:n])
+            else:
+                grown = np.empty(n, dtype=col.dtype)
+                grown[: len(col)] = col
+                setattr(self, f.name, grown)
+
+    @property
+    def n(self) -> int:
+        return len(self.y)
+
+    def __len__(self) -> int:
+        return len(self.y)
+
+    def columns(self) -> dict[str, np.ndarray]:
+        """Field name -> column array (no copies), e.g. for pd.DataFrame(...)."""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        cols = self.columns()
+        names = list(cols)
+        for row in zip(*(c.tolist() for c in cols.values()), strict=True):
+            yield dict(zip(names, row, strict=True))
+
+    def __getitem__(self, i: int) -> dict[str, Any]:
+        return {
+            name: col[i] if col.dtype == object else col[i].item()
+            for name, col in self.columns().items()
+        }
+
+
 class BacktestRunner:
+    __slots__ = ("alpha", "cp_tol", "cp_threshold", "cp_cooldown", "exact_latency", "time_every")
+
     def __init__(
         self,
         alpha: float = 0.1,
@@ -79,104 +276,183 @@ class BacktestRunner:
         *,
         cp_threshold: float | None = None,
         cp_cooldown: int | None = None,
+        exact_latency: bool = True,
+        time_every: int = 1,
     ) -> None:
         self.alpha = float(alpha)
         self.cp_tol = int(cp_tol)
         self.cp_threshold = cp_threshold
         self.cp_cooldown = cp_cooldown
+        # keep every latency sample for exact quantiles; False switches to P²
+        # estimates in O(1) memory, flagged by latency_approx in the metrics
+        self.exact_latency = bool(exact_latency)
+        # time only every K-th prediction; untimed rows get NaN latency and
+        # p50/p95 come from the sampled ticks
+        self.time_every = max(int(time_every), 1)
 
     def run(
-        self, pipe, stream: Iterable[dict[str, Any]]
-    ) -> tuple[dict[str, float], list[dict[str, Any]]]:
-        log: list[dict[str, Any]] = []
-
-        y_true_seq: list[float] = []
-        y_pred_seq: list[float] = []
-        ql_seq: list[float] = []
-        qh_seq: list[float] = []
-        lat_seq: list[float] = []
-
-        prev_tick: dict[str, Any] | None = None
+        self, pipe, stream: Iterable[dict[str, Any]], *, build_log: bool = True
+    ) -> tuple[dict[str, float], BacktestLog]:
+        """
+        Backtest `pipe` over `stream`; returns (metrics, log). With
+        build_log=False only the columns the metrics read are filled
+        (y, y_hat, ql, qh, score, cp_true); t/regime/cp_prob/lat_total_ms
+        are left as None/NaN, which saves per-tick work in sweeps.
+        """
+        # Size the buffers up front when the stream reports len(); otherwise
+        # start small and double on overflow (trimmed to fit after the loop).
+        # The first tick has no prior prediction to score, hence the -1.
+        sized = hasattr(stream, "__len__")
+        cap = max(len(stream) - 1, 0) if sized else 1024  # type: ignore[arg-type]
+        # the log's columns double as the metric buffers
+        log = BacktestLog.empty(cap)
+        y_true_seq, y_pred_seq, ql_seq, qh_seq = log.y, log.y_hat, log.ql, log.qh
+        cp_true_seq, score_seq = log.cp_true, log.score
+        t_seq, regime_seq, cp_prob_seq, lat_log = log.t, log.regime, log.cp_prob, log.lat_total_ms
+        lat_seq = np.empty(cap + 1 if self.exact_latency else 0, dtype=np.float64)
+        n_seen = 0
+        n_lat = 0
+        every = self.time_every
+        lat_p50 = P2Estimator(0.5)
+        lat_p95 = P2Estimator(0.95)
+
+        prev_x: float | None = None
         prev_pred: dict[str, Any] | None = None
         prev_latency: float = 0.0
 
-        for tick in stream:
+        # Column-backed streams skip the per-tick dicts entirely when the
+        # pipeline can take x directly.
+        cols = stream if isinstance(stream, ArrayStream) and hasattr(pipe, "process_scalar") else None
+        columnar = cols is not None
+        step: Callable[[Any], dict[str, Any]]
+        if cols is not None:
+            step = pipe.process_scalar
+            rows = _array_rows(cols)
+        else:
+            step = _bind_predict(pipe)
+            rows = _tick_rows(stream)
+        ingest = _bind_truth(pipe)
+        exact_latency = self.exact_latency
+
+        for i, (x, ts, cp_true, arg) in enumerate(rows):
             # feed last tick's truth before predicting current tick
-            if prev_tick is not None:
-                _ingest_truth(pipe, float(prev_tick["x"]))
-
-            # measure compute-time for this prediction
-            t0 = time.perf_counter()
-            pred = _predict(pipe, tick)
-            t1 = time.perf_counter()
-            compute_ms = (t1 - t0) * 1000.0
-
-
-            curr_latency = _extract_latency_ms(pred)
+            if prev_x is not None:
+                ingest(prev_x)
+
+            # measure compute-time for this prediction (every K-th tick)
+            timed = every == 1 or i % every == 0
+            if timed:
+                t0 = time.perf_counter()
+                pred = step(arg)
+                compute_ms = (time.perf_counter() - t0) * 1000.0
+            else:
+                pred = step(arg)
+
+            if i == 0:
+                get_yhat, get_iv, get_lat = _bind_extractors(pred, self.alpha)
+            curr_latency = get_lat(pred)
             if curr_latency == 0.0:
-                curr_latency = compute_ms
-                # expose it for anyone who reads the pred dict downstream
-                pred.setdefault("latency_ms", {})  # type: ignore[arg-type]
-                if isinstance(pred["latency_ms"], dict):  # type: ignore[index]
-                    pred["latency_ms"]["compute_ms"] = compute_ms  # type: ignore[index]
+                if timed:
+                    curr_latency = compute_ms
+                    # expose it for anyone who reads the pred dict downstream
+                    pred.setdefault("latency_ms", {})  # type: ignore[arg-type]
+                    if isinstance(pred["latency_ms"], dict):  # type: ignore[index]
+                        pred["latency_ms"]["compute_ms"] = compute_ms  # type: ignore[index]
+                else:
+                    curr_latency = math.nan
+
+            if i > cap:
+                # stream is longer than its buffers (unsized, or len() was low)
+                cap = max(2 * cap, 1024)
+                log.resize(cap)
+                y_true_seq, y_pred_seq, ql_seq, qh_seq = log.y, log.y_hat, log.ql, log.qh
+                cp_true_seq, score_seq = log.cp_true, log.score
+                t_seq, regime_seq, cp_prob_seq, lat_log = (
+                    log.t, log.regime, log.cp_prob, log.lat_total_ms
+                )
+                if self.exact_latency:
+                    grown = np.empty(cap + 1, dtype=np.float64)
+                    grown[:n_lat] = lat_seq[:n_lat]
+                    lat_seq = grown
 
             if prev_pred is not None:
                 # Evaluate last prediction against current truth
-                y_true_seq.append(float(tick["x"]))
-                y_pred_seq.append(_extract_yhat(prev_pred))
-                ql, qh = _extract_intervals(prev_pred, self.alpha)
-                ql_seq.append(ql)
-                qh_seq.append(qh)
-
-                cp_true = float(tick.get("cp", tick.get("is_cp", 0.0)) or 0.0)
+                if not columnar:  # columnar streams fill y/cp_true/t after the loop
+                    y_true_seq[i - 1] = x
+                    cp_true_seq[i - 1] = cp_true
+                    if build_log:
+                        t_seq[i - 1] = ts
+                y_pred_seq[i - 1] = get_yhat(prev_pred)
+                ql, qh = get_iv(prev_pred)
+                ql_seq[i - 1] = ql
+                qh_seq[i - 1] = qh
 
                 # prefer real cp_prob if present; otherwise fall back to score
                 score_val = float(prev_pred.get("score", prev_pred.get("cp_prob", 0.0)))
-                cp_prob_val = float(prev_pred.get("cp_prob", score_val))
-
-                log.append(
-                    {
-                        "t": tick.get("timestamp"),
-                        "y": float(tick["x"]),
-                        "y_hat": _extract_yhat(prev_pred),
-                        "ql": ql,
-                        "qh": qh,
-                        "regime": str(prev_pred.get("regime", "")),
-                        "score": score_val,
-                        "cp_prob": cp_prob_val,
-                        "cp_true": cp_true,
-                        "lat_total_ms": float(prev_latency),
-                    }
-                )
-
-            lat_seq.append(curr_latency)
-
-            prev_tick = tick
+                score_seq[i - 1] = score_val
+                if build_log:
+                    cp_prob_seq[i - 1] = float(prev_pred.get("cp_prob", score_val))
+                    regime_seq[i - 1] = str(prev_pred.get("regime", ""))
+                    lat_log[i - 1] = prev_latency
+
+            if curr_latency == curr_latency:  # NaN = not sampled
+                if exact_latency:
+                    lat_seq[n_lat] = curr_latency
+                else:
+                    lat_p50.add(curr_latency)
+                    lat_p95.add(curr_latency)
+                n_lat += 1
+
+            prev_x = x
             prev_pred = pred
             prev_latency = curr_latency
-
-        m: dict[str, float] = {
-            "mae": mae(y_true_seq, y_pred_seq),
-            "rmse": rmse(y_true_seq, y_pred_seq),
-            "smape": smape(y_true_seq, y_pred_seq),
-            "coverage": coverage(y_true_seq, ql_seq, qh_seq),
-        }
-        p = latency_p50_p95(lat_seq)
-        m["latency_p50_ms"] = p["p50"]
-        m["latency_p95_ms"] = p["p95"]
-
+            n_seen = i + 1
+
+        log.resize(max(n_seen - 1, 0))
+        if cols is not None:
+            # truths, flags and timestamps are just the stream's columns shifted by one
+            log.y[:] = cols.x[1:n_seen]
+            log.cp_true[:] = cols.cp[1:n_seen] if cols.cp is not None else 0.0
+            if cols.ts is not None and build_log:
+                # a copy: stream columns may be read-only views of a shared cache
+                log.t = np.array(cols.ts[1:n_seen], copy=True)
+            else:
+                log.t[:] = None
+        if not build_log:
+            # columns nobody filled; keep them well-defined rather than garbage
+            if cols is None:
+                log.t[:] = None
+            log.regime[:] = None
+            log.cp_prob[:] = np.nan
+            log.lat_total_ms[:] = np.nan
+        y_true_seq, y_pred_seq, ql_seq, qh_seq = log.y, log.y_hat, log.ql, log.qh
+        cp_true_seq, score_seq = log.cp_true, log.score
+        lat_seq = lat_seq[:n_lat]
+
+        # every metric below reads the same buffers, no conversion needed
+        m: dict[str, float] = point_metrics(y_true_seq, y_pred_seq, ql_seq, qh_seq)
+        if self.exact_latency:
+            # lat_seq is our own scratch buffer, so select in place
+            p = latency_p50_p95(lat_seq, overwrite_input=True)
+            m["latency_p50_ms"] = p["p50"]
+            m["latency_p95_ms"] = p["p95"]
+        else:
+            m["latency_p50_ms"] = lat_p50.value()
+            m["latency_p95_ms"] = lat_p95.value()
+            m["latency_approx"] = 1.0
+
+        cp_kwargs: dict[str, float | int] = {}
+        if self.cp_threshold is not None:
+            cp_kwargs["threshold"] = float(self.cp_threshold)
+        if self.cp_cooldown is not None:
+            cp_kwargs["cooldown"] = int(self.cp_cooldown)
         try:
-            from .metrics import cp_event_metrics
-
-            cp_kwargs: dict[str, float | int] = {}
-            if self.cp_threshold is not None:
-                cp_kwargs["threshold"] = float(self.cp_threshold)
-            if self.cp_cooldown is not None:
-                cp_kwargs["cooldown"] = int(self.cp_cooldown)
-
-            cp_m: dict[str, float] = cp_event_metrics(log, tol=self.cp_tol, **cp_kwargs)  # type: ignore[arg-type]
-            m.update(cp_m)
-        except Exception:
-            pass
+            cp_m = cp_event_metrics(
+                None, tol=self.cp_tol, cp_true=cp_true_seq, score=score_seq, **cp_kwargs  # type: ignore[arg-type]
+            )
+        except ValueError:
+            # non-finite truth flags: there is nothing to score CP events against
+            cp_m = {}
+        m.update(cp_m)
 
         return m, log
@@ -0,0 +1,430 @@
+# backtest/sweep.py
+"""
+Grid sweep over the knobs this pipeline and runner actually read.
+
+  python -m backtest.sweep --data data/sim.csv --smoke 50 --out artifacts/sweep_sim.ndjson
+
+Each combo writes one NDJSON line: the combo's parameters plus
+{"metrics": ..., "n_points": ...}. Wall-clock latency is left out of the
+metrics, so the output depends only on the data, grid, config and seed,
+not on --workers or --batch. The data stream is parsed once, and
+pipelines are cached per alpha and reset/reconfigured between combos
+instead of being rebuilt.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from backtest.cli_server import _nonfinite_to_none
+from backtest.runner import BacktestRunner
+from core.config import load_config
+from core.pipeline import Pipeline
+from data.replay import ArrayStream, materialize
+
+# parameter -> values tried; alpha/cp_* go to the runner, the rest to Pipeline
+GRID: dict[str, list[Any]] = {
+    "alpha": [0.05, 0.1, 0.2],
+    "ewma_alpha": [0.05, 0.1, 0.2],
+    "regime_vol_threshold": [0.01, 0.02, 0.03],
+    "cp_threshold": [0.3, 0.5, 0.7],
+    "cp_cooldown": [5, 10],
+}
+_PIPELINE_KEYS = ("ewma_alpha", "regime_vol_threshold")
+# latency varies run to run (and with how many workers share the CPUs), so
+# sweep lines leave it out; only the first prediction is timed at all
+_UNTIMED = sys.maxsize
+OUT_BUFFER = 1 << 20
+
+_BASE_CFG: dict[str, Any] = {}
+_STREAM: ArrayStream | None = None
+_PIPE_CACHE: dict[tuple[float], Pipeline] = {}
+# max_rows -> head view of _STREAM; every combo of a pass shares one
+_HEADS: dict[int | None, ArrayStream] = {}
+
+
+def combos(grid: dict[str, list[Any]] = GRID) -> list[dict[str, Any]]:
+    keys = list(grid)
+    return [dict(zip(keys, vals, strict=True)) for vals in itertools.product(*grid.values())]
+
+
+def _setup(data: str, cache: str | None, cfg: dict[str, Any]) -> ArrayStream:
+    """Parse the data and remember the base config (once per process)."""
+    from backtest.cli import _build_stream
+
+    global _STREAM, _BASE_CFG
+    stream = _build_stream(data, cache)
+    # every combo replays the stream, so a one-shot row iterator won't do
+    _STREAM = stream if isinstance(stream, ArrayStream) else materialize(stream)
+    _BASE_CFG = cfg
+    _PIPE_CACHE.clear()
+    _HEADS.clear()
+    return _STREAM
+
+
+# ArrayStream array fields; each is shared with pool workers as its own .npy
+_COLUMNS = ("x", "ts", "cp", "cov")
+
+
+def _spill(stream: ArrayStream, dirpath: str) -> dict[str, Any]:
+    """
+    Write the stream's columns to `dirpath` as .npy files and return a spec
+    that _setup_mapped turns back into an ArrayStream. Object columns (e.g.
+    unparsed timestamps) can't be mapped and travel in the spec by value.
+    """
+    spec: dict[str, Any] = {"cov_names": stream.cov_names}
+    for name in _COLUMNS:
+        col = getattr(stream, name)
+        if col is None or col.dtype == object:
+            spec[name] = col
+        else:
+            path = os.path.join(dirpath, f"{name}.npy")
+            np.save(path, col, allow_pickle=False)
+            spec[name] = path
+    return spec
+
+
+def _setup_mapped(spec: dict[str, Any], cfg: dict[str, Any]) -> None:
+    """Pool initializer: map the parent's spilled columns read-only (one copy in the page cache)."""
+    global _STREAM, _BASE_CFG
+    cols = {
+        name: np.load(v, mmap_mode="r") if isinstance(v, str) else v
+        for name, v in spec.items()
+        if name in _COLUMNS
+    }
+    _STREAM = ArrayStream(**cols, cov_names=tuple(spec["cov_names"]))
+    _BASE_CFG = cfg
+    _PIPE_CACHE.clear()
+    _HEADS.clear()
+
+
+def _head(stream: ArrayStream, n: int | None) -> ArrayStream:
+    """First n ticks as views of the same columns (whole stream for None)."""
+    if n is None or n >= len(stream):
+        return stream
+    return ArrayStream(
+        x=stream.x[:n],
+        ts=None if stream.ts is None else stream.ts[:n],
+        cp=None if stream.cp is None else stream.cp[:n],
+        cov=None if stream.cov is None else stream.cov[:n],
+        cov_names=stream.cov_names,
+    )
+
+
+def _stream_head(max_rows: int | None) -> ArrayStream:
+    """_head of the loaded stream, built once per row limit."""
+    head = _HEADS.get(max_rows)
+    if head is None:
+        if _STREAM is None:
+            raise RuntimeError("sweep stream not loaded; call _setup() first")
+        head = _HEADS[max_rows] = _head(_STREAM, max_rows)
+    return head
+
+
+def _get_pipe(alpha: float) -> Pipeline:
+    """One Pipeline per alpha (its conformal_q); later combos reuse it."""
+    key = (float(alpha),)
+    pipe = _PIPE_CACHE.get(key)
+    if pipe is None:
+        pipe = _PIPE_CACHE[key] = Pipeline({**_BASE_CFG, "conformal_q": 1.0 - float(alpha)})
+    return pipe
+
+
+def _run_one(combo: dict[str, Any], max_rows: int | None = None) -> dict[str, Any]:
+    stream = _stream_head(max_rows)
+    pipe = _get_pipe(combo["alpha"])
+    pipe.reset()
+    pipe.reconfigure(**{k: combo[k] for k in _PIPELINE_KEYS if k in combo})
+    runner = BacktestRunner(
+        alpha=combo["alpha"],
+        cp_threshold=combo.get("cp_threshold"),
+        cp_cooldown=combo.get("cp_cooldown"),
+        exact_latency=False,
+        time_every=_UNTIMED,
+    )
+    metrics, log = runner.run(pipe, stream, build_log=False)
+    metrics = {k: v for k, v in metrics.items() if not k.startswith("latency_")}
+    return {**combo, "metrics": metrics, "n_points": len(log)}
+
+
+def prune_score(res: dict[str, Any]) -> float:
+    """
+    Lower is better: rmse, inflated by how far coverage misses its 1 - alpha
+    target (a miss of one alpha doubles it). NaN rmse ranks last.
+    """
+    m = res["metrics"]
+    rmse = float(m.get("rmse", float("nan")))
+    if rmse != rmse:
+        return float("inf")
+    alpha = float(res["alpha"])
+    miss = abs(float(m.get("coverage", 0.0)) - (1.0 - alpha))
+    return rmse * (1.0 + miss / max(alpha, 1e-9))
+
+
+def _combo_at(grid: dict[str, list[Any]], idx: int) -> dict[str, Any]:
+    """combos(grid)[idx] without building the product (last key varies fastest)."""
+    combo: dict[str, Any] = {}
+    for key in reversed(grid):
+        idx, j = divmod(idx, len(grid[key]))
+        combo[key] = grid[key][j]
+    return {k: combo[k] for k in grid}
+
+
+def _select(grid: dict[str, list[Any]], smoke: int | None, seed: int) -> list[dict[str, Any]]:
+    total = math.prod(len(v) for v in grid.values())
+    if smoke is None or smoke >= total:
+        return combos(grid)
+    # random search: sample positions in the grid, so only the chosen combos
+    # are built (same picks as sampling combos(grid) with this seed)
+    picks = random.Random(seed).sample(range(total), max(smoke, 0))
+    return [_combo_at(grid, i) for i in picks]
+
+
+def run_sweep(
+    data: str,
+    grid: dict[str, list[Any]] = GRID,
+    *,
+    smoke: int | None = None,
+    cfg: dict[str, Any] | None = None,
+    cache: str | None = None,
+    seed: int = 0,
+) -> Iterator[dict[str, Any]]:
+    """Yield one result per combo, in-process; `smoke` keeps a seeded random subset of that size."""
+    todo = _select(grid, smoke, seed)
+    _setup(data, cache, cfg or {})
+    for combo in todo:
+        yield _run_one(combo)
+
+
+def _ndjson_line(rec: dict[str, Any]) -> bytes:
+    """One NDJSON record as UTF-8 bytes; orjson when installed. NaN/inf are written as null either way."""
+    try:
+        import orjson
+    except ModuleNotFoundError:
+        # same bytes orjson writes: compact separators, non-finite floats as null
+        line = json.dumps(_nonfinite_to_none(rec), ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+        return line.encode("utf-8") + b"\n"
+    return orjson.dumps(rec, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+
+
+def _run_batch(batch: list[dict[str, Any]]) -> bytes:
+    """Run a chunk of combos in a worker; one NDJSON blob back instead of one pickle per combo."""
+    return b"".join(_ndjson_line(_run_one(c)) for c in batch)
+
+
+def _score_batch(batch: list[dict[str, Any]], max_rows: int | None) -> list[float]:
+    """Pruning pass: prune_score per combo on the first max_rows ticks."""
+    return [prune_score(_run_one(c, max_rows)) for c in batch]
+
+
+# BLAS/OpenMP pools read these at import time; one thread each under a process pool
+_SINGLE_THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (honours affinity masks / cpusets, unlike cpu_count)."""
+    if hasattr(os, "sched_getaffinity"):
+        return max(len(os.sched_getaffinity(0)), 1)
+    return os.cpu_count() or 1
+
+
+def _parse_cpulist(text: str) -> set[int]:
+    """Kernel cpulist syntax ("0-3,8,10-11") -> {0, 1, 2, 3, 8, 10, 11}."""
+    cpus: set[int] = set()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def numa_nodes() -> list[set[int]]:
+    """
+    Usable CPUs of each NUMA node (Linux sysfs), or [] on single-node
+    machines and wherever the topology or affinity calls are unavailable.
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return []
+    allowed = os.sched_getaffinity(0)
+    nodes = []
+    for path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*/cpulist")):
+        try:
+            cpus = _parse_cpulist(Path(path).read_text()) & allowed
+        except (OSError, ValueError):
+            return []
+        if cpus:
+            nodes.append(cpus)
+    return nodes if len(nodes) > 1 else []
+
+
+def _setup_worker(
+    specs: list[dict[str, Any]], nodes: list[set[int]], counter: Any, cfg: dict[str, Any]
+) -> None:
+    """
+    Pool initializer: on NUMA machines pin this worker to one node (round
+    robin by start order) and map that node's copy of the columns.
+    """
+    with counter.get_lock():
+        wid = counter.value
+        counter.value += 1
+    node = wid % len(specs)
+    if nodes:
+        # pin before the first touch so mapped pages fault in on this node
+        os.sched_setaffinity(0, nodes[node])
+    _setup_mapped(specs[node], cfg)
+
+
+@contextmanager
+def _mapper(
+    workers: int, data: str, cache: str | None, cfg: dict[str, Any]
+) -> Iterator[Callable[..., Iterator[Any]]]:
+    """
+    An order-preserving map over batches: in-process, or on a primed process
+    pool. The data is parsed once in the parent and its columns spilled to
+    temporary .npy files that every worker memory-maps, so J workers share
+    one copy (one per NUMA node, with each worker pinned to a node, on
+    multi-socket machines). Workers are spawned with single-threaded BLAS so they don't
+    each start a full-width thread pool.
+    """
+    if workers <= 1:
+        _setup(data, cache, cfg)
+        yield map
+        return
+
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+
+    # parse once here; workers map the columns instead of each re-reading
+    # (and holding a private copy of) the data
+    stream = _setup(data, cache, cfg)
+    # spawned children inherit os.environ before they import NumPy;
+    # explicit user settings are left alone
+    saved = {k: os.environ.get(k) for k in _SINGLE_THREAD_ENV}
+    for k in _SINGLE_THREAD_ENV:
+        os.environ.setdefault(k, "1")
+    try:
+        with tempfile.TemporaryDirectory(prefix="sweep-") as tmp:
+            # one spilled copy per NUMA node (separate files -> separate
+            # page-cache pages, each first touched by that node's workers)
+            nodes = numa_nodes()
+            specs = []
+            for node in range(max(len(nodes), 1)):
+                sub = os.path.join(tmp, str(node))
+                os.mkdir(sub)
+                specs.append(_spill(stream, sub))
+            ctx = mp.get_context("spawn")
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=ctx,
+                initializer=_setup_worker,
+                initargs=(specs, nodes, ctx.Value("i", 0), cfg),
+            ) as ex:
+                yield partial(ex.map, chunksize=1)
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def sweep_ndjson(
+    data: str,
+    grid: dict[str, list[Any]] = GRID,
+    *,
+    smoke: int | None = None,
+    cfg: dict[str, Any] | None = None,
+    cache: str | None = None,
+    seed: int = 0,
+    workers: int | None = 1,
+    batch_size: int = 32,
+    prune_top: int | None = None,
+    prune_rows: int | None = None,
+) -> Iterator[bytes]:
+    """
+    Yield NDJSON blobs (UTF-8 bytes, one newline-terminated line per result)
+    in combo order. With workers > 1, combos go out in batches of `batch_size`
+    to a process pool whose workers map the parent's parsed columns; workers
+    is capped at the usable CPUs and the number of batches (None = all CPUs).
+
+    With `prune_top`, every combo is first scored (prune_score) on only the
+    first `prune_rows` ticks, and just the best `prune_top` run on the full
+    stream.
+    """
+    todo = _select(grid, smoke, seed)
+    size = max(int(batch_size), 1)
+
+    def batches(items: list[dict[str, Any]]) -> list[list[dict[str, Any]]]:
+        return [items[i : i + size] for i in range(0, len(items), size)]
+
+    n_workers = min(workers or available_cpus(), available_cpus(), max(len(batches(todo)), 1))
+    with _mapper(n_workers, data, cache, cfg or {}) as pmap:
+        if prune_top is not None and prune_top < len(todo):
+            scored = pmap(partial(_score_batch, max_rows=prune_rows), batches(todo))
+            scores = list(itertools.chain.from_iterable(scored))
+            best = sorted(range(len(todo)), key=scores.__getitem__)[: max(prune_top, 0)]
+            todo = [todo[i] for i in sorted(best)]
+        yield from pmap(_run_batch, batches(todo))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Parameter sweep over backtest knobs (NDJSON out).")
+    ap.add_argument("--data", required=True, help="CSV/Parquet file containing at least column 'x'.")
+    ap.add_argument("--out", help="NDJSON output path (default: stdout).")
+    ap.add_argument("--smoke", "--samples", dest="smoke", type=int, default=None,
+                    help="Random search: only run N combos sampled from the grid.")
+    ap.add_argument("--seed", type=int, default=0, help="Seed for --smoke/--samples sampling.")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="Worker processes (default: usable CPUs; 1 = run in-process).")
+    ap.add_argument("--batch", type=int, default=32, help="Combos per worker task.")
+    ap.add_argument("--prune-top", "--prune_top", dest="prune_top", type=int, default=None,
+                    help="Score all combos on a truncated stream first; fully run only the best N.")
+    ap.add_argument("--prune-rows", "--prune_rows", dest="prune_rows", type=int, default=5000,
+                    help="Ticks used for the --prune-top scoring pass.")
+    ap.add_argument("--cache", help="Binary tick cache (.tvc) for --data.")
+    ap.add_argument("--profile", choices=["sim", "market"], help="Config profile to load.")
+    ap.add_argument("--config", help="Path to a YAML config file.")
+    args = ap.parse_args()
+
+    cfg = load_config(args.config, args.profile) or {}
+    # binary with a 1 MiB buffer: each worker blob is written as-is and
+    # syscalls are amortized over many records
+    out = Path(args.out).open("wb", buffering=OUT_BUFFER) if args.out else sys.stdout.buffer
+    try:
+        for blob in sweep_ndjson(
+            args.data,
+            smoke=args.smoke,
+            cfg=cfg,
+            cache=args.cache,
+            seed=args.seed,
+            workers=args.workers,
+            batch_size=args.batch,
+            prune_top=args.prune_top,
+            prune_rows=args.prune_rows,
+        ):
+            out.write(blob)
+    finally:
+        # also on Ctrl-C: whatever finished is flushed, not lost in the buffer
+        out.flush()
+        if out is not sys.stdout.buffer:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+# backtest/tick_cache.py
+"""
+Compact binary tick cache for repeated backtests over the same data.
+
+Layout (little-endian, struct-of-arrays):
+  header  56 bytes: magic, version, flags, n ticks, first timestamp, gap
+          unit, source size, source mtime (ns), and the byte lengths of
+  meta    the source's resolved path and the timestamp format (UTF-8),
+          zero-padded to a multiple of 8 bytes
+  x       n * float64
+  ts      (n - 1) timestamp gaps in multiples of the gap unit (their gcd),
+          int32 when they fit, else int64 (optional)
+  cp      n * uint8 for 0/1 flags, else n * float64 (optional)
+
+Columns are read back with np.memmap, so opening a cache costs one mmap
+instead of a CSV/Parquet decode. Every column comes back with the values
+_stream_from_df would pass through from the source file: string timestamps
+are stored as int64 ns plus the format that renders them back exactly.
+Frames whose timestamps can't be stored that way are refused (ValueError).
+A cache is only reused for the source file (path, size, mtime) it was
+built from.
+"""
+from __future__ import annotations
+
+import os
+import struct
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from data.replay import ArrayStream
+
+MAGIC = b"RFTVC\x00"
+VERSION = 4
+# magic, version, flags, n, ts0, gap unit, source size, source mtime_ns, len(path), len(format)
+_HEADER = struct.Struct("<6sHIQqQQqHH")  # 56 bytes
+
+_HAS_TS = 1
+_HAS_CP = 2
+_TS_WIDE = 4  # timestamp gaps stored as int64
+_TS_DT64 = 8  # gaps are ns of a datetime64[ns] column (else plain int64)
+_TS_FMT = 16  # gaps are ns of string timestamps, rendered back with the stored format
+_CP_F8 = 32  # cp holds values other than 0/1 and is stored as float64
+
+# ISO layouts np.datetime_as_string renders directly (much faster than strftime)
+_ISO_UNITS = {"%Y-%m-%d": "D", "%Y-%m-%dT%H:%M": "m", "%Y-%m-%dT%H:%M:%S": "s"}
+
+
+def _source_id(data_path: str | Path) -> tuple[str, int, int]:
+    """(resolved path, size, mtime_ns) identifying the file a cache was built from."""
+    p = Path(data_path).resolve()
+    st = p.stat()
+    return str(p), st.st_size, st.st_mtime_ns
+
+
+def _read_header(path: Path) -> tuple[tuple[Any, ...], str, str, int] | None:
+    """Header fields, source path, timestamp format and data offset; None if not a cache."""
+    with open(path, "rb") as fh:
+        head = fh.read(_HEADER.size)
+        if len(head) < _HEADER.size:
+            return None
+        fields = _HEADER.unpack(head)
+        if fields[0] != MAGIC or fields[1] != VERSION:
+            return None
+        n_src, n_fmt = fields[8], fields[9]
+        meta = fh.read(n_src + n_fmt)
+    if len(meta) < n_src + n_fmt:
+        return None
+    src, fmt = meta[:n_src].decode(), meta[n_src:].decode()
+    offset = _HEADER.size + -(-len(meta) // 8) * 8
+    return fields, src, fmt, offset
+
+
+def is_fresh(cache_path: str | Path, data_path: str | Path) -> bool:
+    """True if the cache was built from `data_path` as it is now (path, size and mtime)."""
+    c, d = Path(cache_path), Path(data_path)
+    if not c.is_file() or not d.is_file():
+        return False
+    head = _read_header(c)
+    if head is None:
+        return False
+    fields, src, _, _ = head
+    return (src, fields[6], fields[7]) == _source_id(d)
+
+
+def _format_ns(ns: np.ndarray, fmt: str) -> np.ndarray:
+    """int64 ns rendered with strftime format `fmt`, as an object array of str."""
+    import pandas as pd
+
+    base = fmt[:-1] if fmt.endswith("Z") else fmt
+    unit = _ISO_UNITS.get(base.replace(" ", "T", 1))
+    if unit is None:
+        return pd.DatetimeIndex(ns).strftime(fmt).to_numpy(dtype=object)
+    dt = ns.view("datetime64[ns]")
+    if base != fmt:
+        out = np.datetime_as_string(dt, unit=unit, timezone="UTC")  # type: ignore[call-overload]
+    else:
+        out = np.datetime_as_string(dt, unit=unit)  # type: ignore[call-overload]
+    if " " in base:
+        out = np.char.replace(out, "T", " ", count=1)
+    return out.astype(object)
+
+
+def _string_timestamps(col: Any) -> tuple[np.ndarray, str] | None:
+    """int64 ns and a format that renders them back to exactly `col`, if there is one."""
+    import pandas as pd
+    from pandas.tseries.api import guess_datetime_format
+
+    if not len(col):
+        return None
+    first = str(col.iloc[0])
+    candidates = [guess_datetime_format(first)]
+    if first.endswith("Z"):
+        # a literal Z suffix parses naive and renders back unchanged
+        base = guess_datetime_format(first[:-1])
+        candidates.insert(0, None if base is None else base + "Z")
+    for fmt in candidates:
+        if fmt is None or "%z" in fmt:
+            continue
+        try:
+            ts = pd.to_datetime(col, format=fmt)
+        except (TypeError, ValueError):
+            continue
+        if ts.dt.tz is not None or ts.isna().any():
+            continue
+        ns = ts.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        if np.array_equal(_format_ns(ns, fmt), col.to_numpy(dtype=object)):
+            return ns, fmt
+    return None
+
+
+def _timestamp_column(col: Any) -> tuple[np.ndarray, int, str]:
+    """
+    The values _stream_from_df passes through for `col` as int64, plus the
+    flags and string format describing them. Raises ValueError for anything
+    else (floats, tz-aware or mixed objects, missing values, strings that
+    don't render back exactly).
+    """
+    import pandas as pd
+
+    if col.dtype == np.dtype("datetime64[ns]") and not col.isna().any():
+        return col.to_numpy().view(np.int64), _TS_DT64, ""
+    if col.dtype == np.dtype(np.int64):
+        return col.to_numpy(), 0, ""
+    if pd.api.types.infer_dtype(col, skipna=False) == "string":
+        parsed = _string_timestamps(col)
+        if parsed is not None:
+            return parsed[0], _TS_FMT, parsed[1]
+    raise ValueError(f"timestamp column of dtype {col.dtype} can't be cached as-is")
+
+
+def to_binary(df, path: str | Path, source: str | Path | None = None) -> Path:
+    """
+    Write the stream columns of `df` (x, optional timestamp, optional cp/is_cp)
+    to `path`, recording `source` (the file `df` was read from) for is_fresh.
+    The file is written next to the target and renamed into place.
+    Raises ValueError when the timestamp values can't be stored exactly.
+    """
+    import pandas as pd
+
+    path = Path(path)
+    x = df["x"].to_numpy(dtype=np.float64)
+    n = len(x)
+
+    flags = 0
+    fmt = ""
+    gaps = np.empty(0, dtype=np.int32)
+    ts0 = 0
+    unit = 1
+    if "timestamp" in df.columns:
+        ts_vals, kind, fmt = _timestamp_column(df["timestamp"])
+        flags |= _HAS_TS | kind
+        ts0 = int(ts_vals[0]) if n else 0
+        gaps = np.diff(ts_vals)
+        # e.g. hourly ns timestamps become gaps of 1 (x 3.6e12), which fit int32
+        unit = max(int(np.gcd.reduce(gaps)), 1) if gaps.size else 1
+        gaps //= unit
+        i32 = np.iinfo(np.int32)
+        if gaps.size and (gaps.min() < i32.min or gaps.max() > i32.max):
+            flags |= _TS_WIDE
+        else:
+            gaps = gaps.astype(np.int32)
+
+    cp_col = "cp" if "cp" in df.columns else ("is_cp" if "is_cp" in df.columns else None)
+    cp = None
+    if cp_col is not None:
+        flags |= _HAS_CP
+        # same conversion as _stream_from_df: anything unparseable counts as 0
+        cp = pd.to_numeric(df[cp_col], errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+        if ((cp == 0.0) | (cp == 1.0)).all():
+            cp = cp.astype(np.uint8)
+        else:
+            flags |= _CP_F8
+
+    src, size, mtime_ns = _source_id(source) if source is not None else ("", 0, 0)
+    meta = src.encode() + fmt.encode()
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(_HEADER.pack(
+            MAGIC, VERSION, flags, n, ts0, unit, size, mtime_ns, len(src.encode()), len(fmt.encode())
+        ))
+        fh.write(meta + bytes(-len(meta) % 8))
+        fh.write(x.astype("<f8", copy=False).tobytes())
+        if flags & _HAS_TS:
+            fh.write(gaps.astype(gaps.dtype.newbyteorder("<"), copy=False).tobytes())
+        if cp is not None:
+            fh.write(cp.astype(cp.dtype.newbyteorder("<"), copy=False).tobytes())
+    os.replace(tmp, path)
+    return path
+
+
+def open_binary(path: str | Path) -> ArrayStream:
+    """Map a cache written by `to_binary` back into an ArrayStream."""
+    path = Path(path)
+    head = _read_header(path)
+    if head is None:
+        raise ValueError(f"{path}: not a tick cache (or an unsupported version)")
+    (_, _, flags, n, ts0, unit, *_), _, fmt, offset = head
+
+    x = np.memmap(path, dtype="<f8", mode="r", offset=offset, shape=(n,)) if n else np.empty(0)
+    offset += 8 * n
+
+    ts = None
+    if flags & _HAS_TS:
+        gap_dtype = np.dtype("<i8") if flags & _TS_WIDE else np.dtype("<i4")
+        n_gaps = max(n - 1, 0)
+        ts_ns = np.empty(n, dtype=np.int64)
+        if n:
+            ts_ns[0] = ts0
+            if n_gaps:
+                gaps = np.memmap(path, dtype=gap_dtype, mode="r", offset=offset, shape=(n_gaps,))
+                np.cumsum(gaps, dtype=np.int64, out=ts_ns[1:])
+                ts_ns[1:] *= unit
+                ts_ns[1:] += ts0
+        if flags & _TS_FMT:
+            ts = _format_ns(ts_ns, fmt)
+        else:
+            ts = ts_ns.view("datetime64[ns]") if flags & _TS_DT64 else ts_ns
+        offset += gap_dtype.itemsize * n_gaps
+
+    cp = None
+    if flags & _HAS_CP:
+        if flags & _CP_F8:
+            cp = np.memmap(path, dtype="<f8", mode="r", offset=offset, shape=(n,)) if n else np.empty(0)
+        else:
+            raw = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(n,)) if n else np.empty(0)
+            cp = raw.astype(np.float64)
+
+    return ArrayStream(
+        x=np.asarray(x),
+        ts=ts,
+        cp=None if cp is None else np.asarray(cp),
+    )
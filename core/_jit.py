@@ -0,0 +1,31 @@
+# core/_jit.py
+"""
+Optional numba support. `njit` compiles when numba is installed and is a
+no-op decorator otherwise, so kernels stay importable (and testable) as
+plain Python. Check HAVE_NUMBA before routing hot paths through a kernel:
+uncompiled, a scalar loop is slower than the NumPy code it replaces.
+"""
+from __future__ import annotations
+
+from collections.abc import Callable
+from typing import Any
+
+try:
+    from numba import njit as _numba_njit
+except ModuleNotFoundError:
+    _numba_njit = None
+
+HAVE_NUMBA = _numba_njit is not None
+
+
+def njit(*args: Any, **kwargs: Any) -> Any:
+    """Same call forms as numba.njit: @njit, @njit(cache=True)."""
+    if _numba_njit is not None:
+        return _numba_njit(*args, **kwargs)
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+
+    def wrap(fn: Callable[..., Any]) -> Callable[..., Any]:
+        return fn
+
+    return wrap
@@ -0,0 +1,74 @@
+# core/_kernels.py
+"""
+Compiled loops behind core.conformal's weighted quantiles and
+core.features' batch EWMA. Signatures use plain NumPy arrays so numba can
+type them; callers only route through here when core._jit.HAVE_NUMBA is set.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+from core._jit import njit
+
+
+@njit(cache=True)
+def weighted_quantiles(vals: np.ndarray, wts: np.ndarray, qs: np.ndarray) -> np.ndarray:
+    """
+    Smallest value whose running weight (ascending by value, zero weights
+    dropped) reaches q * total, for each q; zeros when no weight is left.
+    Same result as conformal._weighted_quantiles.
+    """
+    n = min(vals.shape[0], wts.shape[0])
+    out = np.zeros(qs.shape[0])
+    v = np.empty(n)
+    w = np.empty(n)
+    m = 0
+    for i in range(n):
+        if wts[i] > 0.0:
+            v[m] = vals[i]
+            w[m] = wts[i]
+            m += 1
+    if m == 0:
+        return out
+    order = np.argsort(v[:m], kind="mergesort")
+    acc = np.empty(m)
+    s = 0.0
+    for j in range(m):
+        s += w[order[j]]
+        acc[j] = s
+    total = acc[m - 1]
+    if total <= 0.0:
+        return out
+    for t in range(qs.shape[0]):
+        cut = qs[t] * total
+        lo = 0
+        hi = m
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if acc[mid] < cut:
+                lo = mid + 1
+            else:
+                hi = mid
+        out[t] = v[order[min(lo, m - 1)]]
+    return out
+
+
+@njit(cache=True)
+def ewma_moments(x: np.ndarray, m0: float, s0: float, alpha: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Running EWMA first and second moments over x, starting from (m0, s0);
+    the same recurrence (and rounding) as FeatureExtractor.update_scalar.
+    """
+    n = x.shape[0]
+    m = np.empty(n)
+    s = np.empty(n)
+    b = 1.0 - alpha
+    mm = m0
+    ss = s0
+    for i in range(n):
+        v = x[i]
+        mm = alpha * v + b * mm
+        ss = alpha * (v * v) + b * ss
+        m[i] = mm
+        s[i] = ss
+    return m, s
@@ -1,15 +1,31 @@
 # core/config.py
 from __future__ import annotations
 
+import copy
+import functools
 from pathlib import Path
 import os
 import yaml
 from typing import Any, Dict
 
+# libyaml-backed loader when PyYAML was built with it; same safe subset
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:  # pragma: no cover - PyYAML without libyaml
+    from yaml import SafeLoader as _SafeLoader  # type: ignore[assignment]
+
+
+@functools.lru_cache(maxsize=128)
+def _read_yaml_cached(path: str, mtime_ns: int, size: int) -> dict[str, Any]:
+    # mtime/size are only part of the key: an edited file misses the cache
+    with open(path, encoding="utf-8") as f:
+        return yaml.load(f, Loader=_SafeLoader) or {}
+
 
 def _read_yaml(p: Path) -> Dict[str, Any]:
-    with p.open("r", encoding="utf-8") as f:
-        return yaml.safe_load(f) or {}
+    """Parsed YAML, re-read only when the file changed; callers get their own copy."""
+    st = p.stat()
+    return copy.deepcopy(_read_yaml_cached(str(p.resolve()), st.st_mtime_ns, st.st_size))
 
 
 def _merge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
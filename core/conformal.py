@@ -1,68 +1,203 @@
 # core/conformal.py
 from __future__ import annotations
 
-from collections import deque
-from math import ceil
+from bisect import bisect_left, insort
+from collections.abc import Sequence
+from math import ceil, exp, expm1, log
 
+import numpy as np
 
-def _unweighted_quantile(vals: list[float], q: float) -> float:
-    # linear interpolation between order stats (kept for internal use)
-    n = len(vals)
-    if n == 0:
-        return 0.0
-    if q <= 0.0:
-        return float(min(vals))
-    if q >= 1.0:
-        return float(max(vals))
-    s = sorted(vals)
-    pos = q * (n - 1)
-    lo = int(pos)
-    hi = min(lo + 1, n - 1)
-    frac = pos - lo
-    return float(s[lo] * (1.0 - frac) + s[hi] * frac)
-
-
-def _unweighted_quantile_strict(vals: list[float], q: float) -> float:
+from core import _kernels
+from core._jit import HAVE_NUMBA
+
+# lists, deques or NumPy arrays; helpers convert once via _as_array
+FloatSeq = Sequence[float] | np.ndarray
+
+
+def _as_array(vals: FloatSeq) -> np.ndarray:
+    if isinstance(vals, np.ndarray):
+        return vals.astype(np.float64, copy=False)
+    return np.fromiter(vals, dtype=np.float64, count=len(vals))
+
+
+def _strict_index(n: int, q: float) -> int:
+    """
+    0-based position of the strict quantile's order statistic (n >= 1). The
+    clamp doubles as the tails: q <= 0 gives the minimum, q >= 1 the maximum.
+    """
+    return max(1, min(ceil((n + 1) * min(max(q, 0.0), 1.0)), n)) - 1
+
+
+def _unweighted_quantile_strict(vals: FloatSeq, q: float) -> float:
     """
     Finite-sample conservative quantile:
     k = ceil((n + 1) * q), clamped to [1, n]; return the k-th order statistic.
     This mirrors the classic split-conformal rank choice and tends to be a bit conservative.
     """
+    return _unweighted_quantiles_strict(vals, [q])[0]
+
+
+def _unweighted_quantiles_strict(vals: FloatSeq, qs: Sequence[float]) -> list[float]:
+    """_unweighted_quantile_strict for several q: one conversion, one partition."""
     n = len(vals)
     if n == 0:
-        return 0.0
-    if q <= 0.0:
-        return float(min(vals))
-    if q >= 1.0:
-        return float(max(vals))
-    s = sorted(vals)
-    k = ceil((n + 1) * q)
-    k = max(1, min(k, n))
-    return float(s[k - 1])
-
-
-def _effective_n(wts: list[float]) -> float:
-    s = sum(wts)
-    s2 = sum(w * w for w in wts)
+        return [0.0] * len(qs)
+    ks = [_strict_index(n, q) for q in qs]
+    part = np.partition(_as_array(vals), sorted(set(ks)))
+    return [float(part[k]) for k in ks]
+
+
+def _effective_n(wts: FloatSeq) -> float:
+    w = _as_array(wts)
+    s = float(w.sum())
+    s2 = float(np.dot(w, w))
     return (s * s / s2) if s2 > 0.0 else 0.0
 
 
-def _weighted_quantile(vals: list[float], wts: list[float], q: float) -> float:
+def _weighted_quantile(vals: FloatSeq, wts: FloatSeq, q: float) -> float:
     # vals already absolute residuals; wts >= 0
     assert 0.0 <= q <= 1.0
-    if not vals:
-        return 0.0
-    pairs = sorted((float(v), float(w)) for v, w in zip(vals, wts, strict=False) if w > 0.0)
-    total = sum(w for _, w in pairs)
+    return _weighted_quantiles(vals, wts, [q])[0]
+
+
+def _weighted_quantiles(vals: FloatSeq, wts: FloatSeq, qs: Sequence[float]) -> list[float]:
+    """_weighted_quantile for several q: the sort and cumsum are shared."""
+    if not len(vals):
+        return [0.0] * len(qs)
+    if HAVE_NUMBA:
+        return _kernels.weighted_quantiles(
+            _as_array(vals), _as_array(wts), np.asarray(qs, dtype=np.float64)
+        ).tolist()
+    n = min(len(vals), len(wts))
+    v, w = _as_array(vals)[:n], _as_array(wts)[:n]
+    keep = w > 0.0
+    v, w = v[keep], w[keep]
+    if v.size == 0:
+        return [0.0] * len(qs)
+    order = np.argsort(v, kind="stable")
+    v = v[order]
+    acc = np.cumsum(w[order])
+    total = float(acc[-1])
     if total <= 0.0:
-        return 0.0
-    cutoff = q * total
-    acc = 0.0
-    for v, w in pairs:
-        acc += w
-        if acc >= cutoff:
-            return float(v)
-    return float(pairs[-1][0])
+        return [0.0] * len(qs)
+    # first value whose running weight reaches each cutoff
+    ks = np.searchsorted(acc, np.asarray(qs, dtype=np.float64) * total, side="left")
+    return [float(v[min(int(k), v.size - 1)]) for k in ks]
+
+
+class _DecayBuffer:
+    """
+    Residual window with exponential-decay weights kept implicitly: each entry
+    stores the buffer's append counter, and its weight decay**age is derived
+    only when an interval needs it. Appends are O(1) (no per-entry rescale).
+
+    With keep_sorted, a sorted copy of the window is maintained as well
+    (bisect insert/evict), so unweighted order statistics are plain index
+    lookups. NaN residuals can't be ordered; while any is in the window the
+    quantile methods fall back to the array helpers.
+
+    `memo` holds quantiles derived from the current window for the owner to
+    reuse across interval calls; every append clears it.
+    """
+
+    __slots__ = ("_res", "_born", "_head", "n", "clock", "sorted", "n_nan", "memo")
+
+    def __init__(self, window: int, keep_sorted: bool = False) -> None:
+        # ring buffers: slot _head is written next; full once n == window
+        self._res = np.empty(window, dtype=np.float64)
+        self._born = np.empty(window, dtype=np.int64)
+        self._head = 0
+        self.n = 0
+        self.clock = 0
+        self.sorted: list[float] | None = [] if keep_sorted and window > 0 else None
+        self.n_nan = 0
+        self.memo: dict[tuple, tuple[bool, list[float]]] = {}
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _chrono(self, ring: np.ndarray) -> np.ndarray:
+        """Oldest-first contents: a view until the ring wraps, then one concatenate."""
+        if self.n < ring.size or self._head == 0:
+            return ring[: self.n]
+        return np.concatenate((ring[self._head :], ring[: self._head]))
+
+    @property
+    def res(self) -> np.ndarray:
+        """Residuals in the window, oldest first."""
+        return self._chrono(self._res)
+
+    def append(self, r: float) -> None:
+        cap = self._res.size
+        if cap == 0:
+            return
+        if self.memo:
+            self.memo.clear()
+        full = self.n == cap
+        srt = self.sorted
+        if srt is not None:
+            if full:
+                old = float(self._res[self._head])  # about to be overwritten
+                if old != old:
+                    self.n_nan -= 1
+                else:
+                    del srt[bisect_left(srt, old)]
+            if r != r:
+                self.n_nan += 1
+            else:
+                insort(srt, r)
+        self._res[self._head] = r
+        self._born[self._head] = self.clock
+        self._head = (self._head + 1) % cap
+        if not full:
+            self.n += 1
+        self.clock += 1
+
+    def weights(self, decay: float) -> np.ndarray:
+        """
+        decay**age per entry, oldest first (newest = 1.0); old entries may
+        underflow to 0. decay >= 1 means no forgetting: all weights are 1.
+        """
+        if decay >= 1.0:
+            return np.ones(self.n)
+        age = (self.clock - 1) - self._chrono(self._born)
+        return np.power(decay, age, dtype=np.float64)
+
+    def effective_n(self, decay: float) -> float:
+        """
+        Kish effective N of weights(decay) without building them: ages are
+        always 0..n-1, so sum(w)**2 / sum(w*w) is a ratio of geometric series,
+        (1 - d**n)(1 + d) / ((1 - d)(1 + d**n)).
+        """
+        n = self.n
+        if not n or decay <= 0.0:
+            return float(n > 0)
+        if decay >= 1.0:
+            return float(n)
+        log_d = log(decay)
+        dn = exp(n * log_d)
+        # expm1 keeps 1 - d and 1 - d**n accurate for decay close to 1
+        return expm1(n * log_d) / expm1(log_d) * (1.0 + decay) / (1.0 + dn)
+
+    def _ordered(self) -> list[float] | None:
+        return self.sorted if self.sorted is not None and not self.n_nan else None
+
+    def strict_quantiles(self, qs: Sequence[float]) -> list[float]:
+        """_unweighted_quantiles_strict of the window."""
+        srt = self._ordered()
+        if srt is None or not srt:
+            return _unweighted_quantiles_strict(self.res, qs)
+        n = len(srt)
+        return [float(srt[_strict_index(n, q)]) for q in qs]
+
+    def uniform_quantiles(self, qs: Sequence[float]) -> list[float]:
+        """_weighted_quantiles of the window with all weights 1."""
+        srt = self._ordered()
+        if srt is None or not srt:
+            return _weighted_quantiles(self.res, np.ones(self.n), qs)
+        n = len(srt)
+        # first sorted value whose running count reaches q * n
+        return [float(srt[max(0, min(ceil(q * float(n)) - 1, n - 1))]) for q in qs]
 
 
 class OnlineConformal:
@@ -90,45 +225,77 @@ class OnlineConformal:
         self.cold_scale = float(cold_scale)
         self.min_eff_n = float(min_eff_n)
 
-        self.res_global: deque[float] = deque(maxlen=self.window)
-        self.wts_global: deque[float] = deque(maxlen=self.window)
+        # weights are decay**age, derived on demand (see _DecayBuffer); the
+        # quantile and effective-N are scale-free, so no renormalization
+        self._global = _DecayBuffer(self.window, keep_sorted=self.decay == 1.0)
+        self._by_regime: dict[str, _DecayBuffer] = {}
 
-        self._res_by_regime: dict[str, deque[float]] = {}
-        self._wts_by_regime: dict[str, deque[float]] = {}
+    @property
+    def res_global(self) -> np.ndarray:
+        """Global residual window, oldest first."""
+        return self._global.res
 
-    def _decay(self, wts: deque[float]) -> None:
-        if not wts:
-            return
-        if self.decay < 1.0:
-            # exponential forgetting
-            for i in range(len(wts)):
-                wts[i] *= self.decay
-            # simple renormalization to avoid underflow over long runs
-            m = max(wts) if wts else 0.0
-            if m > 0.0 and m < 1e-6:
-                scale = 1.0 / m
-                for i in range(len(wts)):
-                    wts[i] *= scale
-
-    def _buffers_for(self, regime: str | None) -> tuple[deque[float], deque[float]]:
+    def _buffer_for(self, regime: str | None) -> _DecayBuffer:
         if not self.by_regime or not regime:
-            return self.res_global, self.wts_global
-        if regime not in self._res_by_regime:
-            self._res_by_regime[regime] = deque(maxlen=self.window)
-            self._wts_by_regime[regime] = deque(maxlen=self.window)
-        return self._res_by_regime[regime], self._wts_by_regime[regime]
+            return self._global
+        buf = self._by_regime.get(regime)
+        if buf is None:
+            buf = self._by_regime[regime] = _DecayBuffer(self.window, keep_sorted=self.decay == 1.0)
+        return buf
 
     def update(self, y_hat: float, y_true: float, regime_label: str | None = None) -> None:
         r = abs(float(y_true) - float(y_hat))
-        self._decay(self.wts_global)
-        self.res_global.append(r)
-        self.wts_global.append(1.0)
-
+        self._global.append(r)
         if self.by_regime:
-            res_q, wts_q = self._buffers_for(regime_label)
-            self._decay(wts_q)
-            res_q.append(r)
-            wts_q.append(1.0)
+            self._buffer_for(regime_label).append(r)
+
+    def _own_quantiles(self, buf: _DecayBuffer, qs: list[float]) -> tuple[bool, list[float]]:
+        """(strict, quantiles) of `buf` alone; strict marks the low-effective-N fallback."""
+        # guard: if effective N is small, use a safer unweighted (strict) 1−α quantile
+        if buf.effective_n(self.decay) < self.min_eff_n:
+            return True, buf.strict_quantiles(qs)
+        if self.decay == 1.0:
+            return False, buf.uniform_quantiles(qs)
+        # main: weighted 1−α quantile from the active buffer
+        wts = buf.weights(self.decay)
+        if wts.size:
+            return False, _weighted_quantiles(buf.res, wts, qs)
+        return False, buf.strict_quantiles(qs)
+
+    def _floor_quantiles(self, qs: list[float]) -> list[float]:
+        glb = self._global
+        if self.decay < 1.0:
+            return _weighted_quantiles(glb.res, glb.weights(self.decay), qs)
+        return glb.strict_quantiles(qs)
+
+    def _radii(self, buf: _DecayBuffer, qs: list[float], scale_hint: float | None) -> list[float]:
+        """
+        Interval radius for each quantile level in `qs`, all from one pass
+        over the buffers (sorted windows without decay, else shared weights
+        and a single sort/cumsum per buffer). Per-buffer results are memoized
+        until the next update, so repeated interval calls are lookups.
+        """
+        base = float(scale_hint if scale_hint is not None else self.cold_scale)
+        # empty buffer → cold scale or provided hint
+        if not len(buf):
+            return [base] * len(qs)
+
+        key = ("own", tuple(qs), self.decay, self.min_eff_n)
+        hit = buf.memo.get(key)
+        if hit is None:
+            hit = buf.memo[key] = self._own_quantiles(buf, qs)
+        strict, q_reg = hit
+        if strict:
+            return [float(max(q, base)) for q in q_reg]
+
+        # GLOBAL FLOOR:
+        if len(self._global):
+            fkey = ("floor", tuple(qs), self.decay)
+            floor = self._global.memo.get(fkey)
+            if floor is None:
+                floor = self._global.memo[fkey] = (False, self._floor_quantiles(qs))
+            q_reg = [max(r, g) for r, g in zip(q_reg, floor[1], strict=True)]
+        return [float(q) for q in q_reg]
 
     def interval(
         self,
@@ -138,40 +305,13 @@ class OnlineConformal:
         scale_hint: float | None = None,
         alphas_multi: list[float] | None = None,
     ):
-        def _q_for(buf_res: deque[float], buf_wt: deque[float], a: float) -> float:
-            # empty buffer → cold scale or provided hint
-            if not buf_res:
-                base = scale_hint if scale_hint is not None else self.cold_scale
-                return float(base)
-
-            # guard: if effective N is small, use a safer unweighted (strict) 1−α quantile
-            eff = _effective_n(list(buf_wt)) if buf_wt else float(len(buf_res))
-            if eff < self.min_eff_n:
-                q_unw = _unweighted_quantile_strict(list(buf_res), 1.0 - a)
-                base = scale_hint if scale_hint is not None else self.cold_scale
-                return float(max(q_unw, float(base)))
-
-            # main: weighted 1−α quantile from the active buffer
-            q_reg = _weighted_quantile(list(buf_res), list(buf_wt), 1.0 - a) if buf_wt else \
-                    _unweighted_quantile_strict(list(buf_res), 1.0 - a)
-
-            # GLOBAL FLOOR:
-            if self.res_global:
-                if self.decay < 1.0 and self.wts_global:
-                    q_glb = _weighted_quantile(list(self.res_global), list(self.wts_global), 1.0 - a)
-                else:
-                    q_glb = _unweighted_quantile_strict(list(self.res_global), 1.0 - a)
-                q_reg = max(q_reg, q_glb)
-            return float(q_reg)
-
-        res_q, wts_q = self._buffers_for(regime_label)
-
+        buf = self._buffer_for(regime_label)
+        alphas = [float(a) for a in alphas_multi] if alphas_multi else [float(alpha)]
+        qs = self._radii(buf, [1.0 - a for a in alphas], scale_hint)
         if alphas_multi:
-            out: dict[str, tuple[float, float]] = {}
-            for a in alphas_multi:
-                q = _q_for(res_q, wts_q, float(a))
-                out[f"alpha={a:.2f}"] = (float(y_hat - q), float(y_hat + q))
-            return out
-
-        q = _q_for(res_q, wts_q, float(alpha))
+            return {
+                f"alpha={a:.2f}": (float(y_hat - q), float(y_hat + q))
+                for a, q in zip(alphas_multi, qs, strict=True)
+            }
+        q = qs[0]
         return float(y_hat - q), float(y_hat + q)
@@ -4,7 +4,7 @@ from __future__ import annotations
 from typing import Any
 
 from core.config import load_config
-from core.features import FeatureExtractor
+from core.features import FeatureExtractor, _sf
 from core.types import DetectorOut, Features
 
 
@@ -47,24 +47,6 @@ class BOCPD:
         )
         self.run_length = 0  # exposed for tests
 
-    def _z_from_feat(self, x: float, feat: Features) -> float:
-        mean = float(feat.get("ewm_mean", 0.0))
-        std = float(feat.get("ewm_std", 0.0))
-        if std <= 0.0:
-            return 0.0
-        return (x - mean) / std
-
-    def _cp_from_z(self, z: float, warmup: bool) -> float:
-        a = abs(float(z))
-        if warmup:
-            a *= 0.5
-        p = a / self.z_threshold
-        if p < 0.0:
-            p = 0.0
-        if p > 1.0:
-            p = 1.0
-        return p
-
     def update(self, x: float | dict[str, Any], features: Features | None = None) -> dict[str, Any]:
         """
         Update with a new observation. Accepts raw x or a tick dict (we'll take its 'x').
@@ -75,21 +57,25 @@ class BOCPD:
         else:
             x_val = float(x)
 
-        feat: Features = features if features is not None else self.fx.update(x_val)
-        z = self._z_from_feat(x_val, feat)
-        cp_prob = self._cp_from_z(z, bool(feat.get("warmup", False)))
-
-        if abs(z) >= self.z_threshold:
-            self.run_length = 0
+        if features is not None:
+            mean = float(features.get("ewm_mean", 0.0))
+            std = float(features.get("ewm_std", 0.0))
+            warmup = bool(features.get("warmup", False))
         else:
-            self.run_length += 1
+            # internal features: only mean/std/warmup are needed, skip the dict
+            mean, _, std, _, warmup = self.fx.update_scalar(_sf(x_val))
+
+        # standardized surprise; |z| >= 0, so only the upper clamp can bite
+        a = abs((x_val - mean) / std) if std > 0.0 else 0.0
+        cp_prob = min((0.5 * a if warmup else a) / self.z_threshold, 1.0)
+        self.run_length = 0 if a >= self.z_threshold else self.run_length + 1
 
-        regime = "volatile" if float(feat.get("ewm_std", 0.0)) >= self.vol_th else "calm"
+        regime = "volatile" if std >= self.vol_th else "calm"
 
         # Return both legacy "meta.cp_prob" and a top-level copy
         return {
-            "meta": {"cp_prob": float(cp_prob)},
-            "cp_prob": float(cp_prob),
+            "meta": {"cp_prob": cp_prob},
+            "cp_prob": cp_prob,
             "regime": regime,
         }
 
@@ -5,6 +5,11 @@ from collections.abc import Mapping
 from math import isnan, sqrt
 from typing import Any
 
+import numpy as np
+
+from core import _kernels
+from core._jit import HAVE_NUMBA
+
 
 def _sf(v: float, d: float = 0.0) -> float:
     try:
@@ -48,56 +53,116 @@ class FeatureExtractor:
         self.alpha = max(1e-6, min(a, 1.0))
         self.min_warmup = int(max(1, min_warmup))
 
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all observed data; alpha/min_warmup are kept."""
         self.count = 0
         self.m = 0.0  # E[x]
         self.s = 0.0  # E[x^2]
         self._prev = None  # placeholder if later ac1
 
-    def _update_core(self, x: float) -> dict[str, Any]:
+    def update_scalar(self, x: float) -> tuple[float, float, float, float, bool]:
+        """
+        Ingest an already-cleaned float and return (ewm_mean, ewm_var, ewm_std,
+        z, warmup) as a tuple: the per-tick path for callers that don't need
+        the feature dict.
+        """
         a = self.alpha
+        b = 1.0 - a
         self.count += 1
 
         # Update mean and second moment
-        self.m = a * x + (1.0 - a) * self.m
-        self.s = a * (x * x) + (1.0 - a) * self.s
+        m = self.m = a * x + b * self.m
+        s = self.s = a * (x * x) + b * self.s
 
-        var = max(self.s - self.m * self.m, 0.0)
+        var = max(s - m * m, 0.0)
         std = sqrt(var)
-        warmup = self.count < self.min_warmup
 
         # Simple z-score; 0.0 if std==0
-        z = (x - self.m) / std if std > 0.0 else 0.0
-
-        # Stub for lag-1 autocorr to satisfy tests
-        ac1 = 0.0
+        z = (x - m) / std if std > 0.0 else 0.0
+        return m, var, std, z, self.count < self.min_warmup
 
+    def _update_core(self, x: float, rv: float | None = None) -> dict[str, Any]:
+        m, var, std, z, warmup = self.update_scalar(x)
         return {
-            "ewm_mean": self.m,
+            "ewm_mean": m,
             "ewm_var": var,
             "ewm_std": std,
             "ewm_vol": std,   # alias expected by tests
             "z": z,
-            "ac1": ac1,
+            "ac1": 0.0,  # stub for lag-1 autocorr to satisfy tests
             "warmup": warmup,
+            "rv": var if rv is None else rv,
         }
 
+    def update_many(self, xs: Any) -> dict[str, np.ndarray]:
+        """
+        Feed a whole batch of raw x values (offline scoring) and return each
+        feature of update(x) as an array, one entry per input. State carries
+        over exactly as if update() had been called per value.
+        """
+        x = np.asarray(xs, dtype=np.float64).ravel()
+        x = np.where(np.isnan(x), 0.0, x)  # same cleaning as update()
+        a = self.alpha
+        if HAVE_NUMBA:
+            m, s = _kernels.ewma_moments(x, self.m, self.s, a)
+        else:
+            # no stable vectorized form of the recurrence; a plain loop over
+            # Python floats still skips the per-tick dicts
+            b = 1.0 - a
+            mm, ss = self.m, self.s
+            ml, sl = [], []
+            for v in x.tolist():
+                mm = a * v + b * mm
+                ss = a * (v * v) + b * ss
+                ml.append(mm)
+                sl.append(ss)
+            m, s = np.array(ml), np.array(sl)
+        if x.size:
+            self.m, self.s = float(m[-1]), float(s[-1])
+        count = self.count + np.arange(1, x.size + 1)
+        self.count += x.size
+
+        var = np.maximum(s - m * m, 0.0)
+        std = np.sqrt(var)
+        safe = np.where(std > 0.0, std, 1.0)
+        z = np.where(std > 0.0, (x - m) / safe, 0.0)
+        return {
+            "ewm_mean": m,
+            "ewm_var": var,
+            "ewm_std": std,
+            "ewm_vol": std,
+            "z": z,
+            "ac1": np.zeros(x.size),
+            "warmup": count < self.min_warmup,
+            "rv": var,
+        }
+
+    def update_x(self, x: float) -> dict[str, Any]:
+        """
+        update() for a plain float that is already clean (not NaN): no
+        dispatch or coercion. Preferred for streaming callers that want the
+        feature dict; update_scalar skips the dict as well.
+        """
+        return self._update_core(x)
+
     def update(self, x_or_tick: float | Mapping[str, Any]) -> dict[str, Any]:
         """
         Accept either a raw float x or a tick dict with keys:
         {"timestamp": ..., "x": float, "covariates": {...}}
         """
+        if type(x_or_tick) is float:
+            # common case first: skips the Mapping ABC check and _sf's try
+            return self._update_core(x_or_tick if x_or_tick == x_or_tick else 0.0)
         if isinstance(x_or_tick, Mapping):
             x = _sf(x_or_tick.get("x", 0.0))
             cov = x_or_tick.get("covariates") or {}
-            out = self._update_core(x)
-            try:
-                rv_val = float(cov.get("rv")) if isinstance(cov, Mapping) and "rv" in cov else out["ewm_var"]
-            except Exception:
-                rv_val = out["ewm_var"]
-            out["rv"] = rv_val
-            return out
-        else:
-            x = _sf(x_or_tick)
-            out = self._update_core(x)
-            out["rv"] = out["ewm_var"]
-            return out
+            rv_val = None
+            if isinstance(cov, Mapping) and "rv" in cov:
+                try:
+                    rv_val = float(cov.get("rv"))
+                except Exception:
+                    rv_val = None
+            return self._update_core(x, rv_val)
+        return self._update_core(_sf(x_or_tick))
@@ -1,10 +1,14 @@
 # core/pipeline.py
 from __future__ import annotations
 
+from bisect import bisect_left, insort
 from collections import OrderedDict, deque
+from collections.abc import Iterable, Iterator
 from math import isnan
 from typing import Any
 
+import numpy as np
+
 from core.config import load_config
 from core.features import FeatureExtractor
 from core.types import Tick
@@ -26,6 +30,73 @@ def _percentile(sorted_list, q: float) -> float:
     return float(sorted_list[idx])
 
 
+# below this many residuals a list sort beats the ndarray round trip
+_SELECT_MIN = 384
+
+
+def _buffer_percentile(buf: deque[float], q: float) -> float:
+    """_percentile of an unsorted buffer: an O(n) partition instead of a full sort when large."""
+    n = len(buf)
+    if n < _SELECT_MIN:
+        return _percentile(sorted(buf), q)
+    idx = int((n - 1) * min(max(q, 0.0), 1.0))
+    arr = np.fromiter(buf, dtype=np.float64, count=n)
+    return float(np.partition(arr, idx)[idx])
+
+
+class _SortedWindow:
+    """
+    Residual window that behaves like deque(maxlen=...) (append, iterate,
+    len, clear) and also keeps a sorted copy, updated by bisect on each
+    append/evict, so percentile() is an index lookup instead of a per-tick
+    sort. NaN residuals can't be ordered; while any is in the window
+    percentile() falls back to selecting from the raw values.
+    """
+
+    __slots__ = ("order", "sorted", "n_nan")
+
+    def __init__(self, maxlen: int, values: Iterable[float] = ()) -> None:
+        # bulk load (resize, snapshot restore): keep the newest maxlen values
+        # and sort once instead of inserting one by one
+        self.order: deque[float] = deque(values, maxlen=maxlen)
+        self.sorted: list[float] = [v for v in self.order if v == v]
+        self.sorted.sort()
+        self.n_nan = len(self.order) - len(self.sorted)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __iter__(self) -> Iterator[float]:
+        return iter(self.order)
+
+    def append(self, r: float) -> None:
+        order = self.order
+        if order.maxlen == 0:
+            return
+        if len(order) == order.maxlen:
+            old = order[0]  # evicted by the append below
+            if old != old:
+                self.n_nan -= 1
+            else:
+                del self.sorted[bisect_left(self.sorted, old)]
+        order.append(r)
+        if r != r:
+            self.n_nan += 1
+        else:
+            insort(self.sorted, r)
+
+    def clear(self) -> None:
+        self.order.clear()
+        self.sorted.clear()
+        self.n_nan = 0
+
+    def percentile(self, q: float) -> float:
+        """_percentile of the window's values."""
+        if self.n_nan:
+            return _buffer_percentile(self.order, q)
+        return _percentile(self.sorted, q)
+
+
 class Pipeline:
     """
     Single-series, online pipeline:
@@ -44,11 +115,12 @@ class Pipeline:
 
         # Conformal quantile
         self.q = float(self.cfg.get("conformal_q", 0.9))
+        self._set_interval_keys()
         self.maxlen = int(self.cfg.get("conformal_maxlen", 2000))
-        self.global_res: deque[float] = deque(maxlen=self.maxlen)
-        self.regime_res: dict[str, deque[float]] = {
-            "calm": deque(maxlen=self.maxlen),
-            "volatile": deque(maxlen=self.maxlen),
+        self.global_res = _SortedWindow(self.maxlen)
+        self.regime_res: dict[str, _SortedWindow] = {
+            "calm": _SortedWindow(self.maxlen),
+            "volatile": _SortedWindow(self.maxlen),
         }
 
         # Service book-keeping for /predict to /truth correlation
@@ -62,6 +134,49 @@ class Pipeline:
         self._last_y_hat: float | None = None
         self._last_regime: str | None = None
 
+    def reset(self) -> None:
+        """Drop all learned state (features, residuals, pending) but keep the config."""
+        self.fx.reset()
+        self.global_res.clear()
+        for buf in self.regime_res.values():
+            buf.clear()
+        self.pending.clear()
+        self._last_y_hat = None
+        self._last_regime = None
+
+    def reconfigure(self, **overrides: Any) -> None:
+        """
+        Apply config overrides in place (e.g. between sweep combos) without
+        rebuilding the pipeline. Keys the pipeline reads are applied to the live
+        objects; everything else is just recorded in cfg. Learned state is
+        untouched, so call reset() first for a fresh run.
+        """
+        # consecutive sweep combos often repeat values; skip the cfg copy then
+        overrides = {k: v for k, v in overrides.items() if k not in self.cfg or self.cfg[k] != v}
+        if not overrides:
+            return
+        self.cfg = {**self.cfg, **overrides}
+        if "ewma_alpha" in overrides or "min_warmup" in overrides:
+            # same clamping as FeatureExtractor.__init__
+            self.fx.alpha = max(1e-6, min(float(self.cfg.get("ewma_alpha", 0.1)), 1.0))
+            self.fx.min_warmup = int(max(1, int(self.cfg.get("min_warmup", 20))))
+        if "conformal_q" in overrides:
+            self.q = float(self.cfg["conformal_q"])
+            self._set_interval_keys()
+        if "conformal_maxlen" in overrides:
+            self.maxlen = int(self.cfg["conformal_maxlen"])
+            self.global_res = _SortedWindow(self.maxlen, self.global_res)
+            self.regime_res = {k: _SortedWindow(self.maxlen, v) for k, v in self.regime_res.items()}
+        if "pending_cap" in overrides:
+            self.pending_cap = int(self.cfg["pending_cap"])
+        if "regime_vol_threshold" in overrides:
+            self.vol_th = float(self.cfg["regime_vol_threshold"])
+
+    def _set_interval_keys(self) -> None:
+        # keys of the per-tick intervals map depend only on q
+        self._alpha_key = f"alpha={1.0 - self.q:.2f}"
+        self._legacy_key = str(int(self.q * 100))
+
     #  service hooks 
     def register_prediction(self, pred_id: str, y_hat: float, regime: str) -> None:
         self.pending[pred_id] = (float(y_hat), str(regime))
@@ -103,15 +218,16 @@ class Pipeline:
         # Learn against the last prediction produced by process()
         if self._last_y_hat is None:
             return
-        self._learn_residual(float(y), float(self._last_y_hat), self._last_regime)
+        self._learn_residual(float(y), self._last_y_hat, self._last_regime)
 
     #  main step 
     def process(self, tick: Tick) -> dict[str, Any]:
-        x = _safe_float(tick["x"])
-        f = self.fx.update(x)
-        mean = float(f["ewm_mean"])
-        std = float(f["ewm_std"])
-        warmup = bool(f["warmup"])
+        return self.process_scalar(tick["x"])
+
+    def process_scalar(self, x: float) -> dict[str, Any]:
+        """Same as process(), for callers that hold x directly (no tick dict)."""
+        x = _safe_float(x)
+        mean, _, std, _, warmup = self.fx.update_scalar(x)
 
         # Forecast: next-tick mean proxy
         y_hat = mean
@@ -120,16 +236,14 @@ class Pipeline:
         regime = "volatile" if std >= self.vol_th else "calm"
 
         # Build interval radius from residual buffers (per-regime with global fallback)
-        reg_buf = list(self.regime_res.get(regime, deque()))
-        reg_buf.sort()
-        glob = list(self.global_res)
-        glob.sort()
-
-        r_reg = _percentile(reg_buf, self.q) if reg_buf else 0.0
-        r_glob = _percentile(glob, self.q) if glob else 0.0
+        # (percentile() of an empty window is 0.0)
+        reg_buf = self.regime_res[regime]
+        n_reg = len(reg_buf)
+        r_reg = reg_buf.percentile(self.q)
+        r_glob = self.global_res.percentile(self.q)
 
         degraded = False
-        if len(reg_buf) < 30 and r_glob > r_reg:
+        if n_reg < 30 and r_glob > r_reg:
             r = r_glob
             degraded = True
         else:
@@ -142,14 +256,13 @@ class Pipeline:
         score = min(max(std / max(self.vol_th, 1e-12), 0.0), 1.0)
 
         # Remember last prediction so update_truth() can learn next tick
-        self._last_y_hat = float(y_hat)
-        self._last_regime = str(regime)
+        # (y_hat is the extractor's float mean, regime one of two literals)
+        self._last_y_hat = y_hat
+        self._last_regime = regime
 
         # Keep both explicit bounds and an intervals map for compatibility
-        intervals = {
-            f"alpha={1.0 - self.q:.2f}": [interval_low, interval_high],
-            str(int(self.q * 100)): [interval_low, interval_high],  # legacy key
-        }
+        bounds = (interval_low, interval_high)  # shared by both keys; read-only
+        intervals = {self._alpha_key: bounds, self._legacy_key: bounds}  # second is the legacy key
 
         return {
             "y_hat": y_hat,
@@ -165,8 +278,8 @@ class Pipeline:
     #  snapshot state (buffers + pending only) 
     def state_dict(self) -> dict[str, Any]:
         return {
-            "global_res": list(self.global_res),
-            "regime_res": {k: list(v) for k, v in self.regime_res.items()},
+            "global_res": list(self.global_res.order),
+            "regime_res": {k: list(v.order) for k, v in self.regime_res.items()},
             "pending": [
                 {"prediction_id": pid, "y_hat": yh, "regime": rg}
                 for pid, (yh, rg) in self.pending.items()
@@ -176,11 +289,10 @@ class Pipeline:
     @classmethod
     def from_state(cls, cfg: dict[str, Any] | None, state: dict[str, Any]) -> Pipeline:
         self = cls(cfg)
-        for v in state.get("global_res", []):
-            self.global_res.append(float(v))
+        self.global_res = _SortedWindow(self.maxlen, map(float, state.get("global_res", [])))
         for k in ("calm", "volatile"):
-            for v in state.get("regime_res", {}).get(k, []):
-                self.regime_res[k].append(float(v))
+            vals = state.get("regime_res", {}).get(k, [])
+            self.regime_res[k] = _SortedWindow(self.maxlen, map(float, vals))
         for rec in state.get("pending", []):
             pid = rec.get("prediction_id")
             if pid:
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import dataclasses
+import functools
 import os
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass
 from typing import Any
 
+import numpy as np
+
 
 def _parse_boolish(val: Any) -> int:
     """Return 1 for truthy markers, else 0."""
@@ -13,6 +18,79 @@ def _parse_boolish(val: Any) -> int:
     return 1 if s in {"1", "true", "t", "yes", "y"} else 0
 
 
+@dataclass
+class ArrayStream:
+    """
+    Column-backed (struct-of-arrays) tick source.
+
+    Iterating yields plain tick dicts, so it works anywhere a Replay does;
+    BacktestRunner recognizes it and reads the columns directly instead.
+      x:  float64 target per tick
+      ts: optional timestamps (any dtype), passed through verbatim
+      cp: optional float64 ground-truth CP flags (0/1)
+      cov: optional float64 (n, k) covariates named by cov_names; NaN = missing
+    """
+
+    x: np.ndarray
+    ts: np.ndarray | None = None
+    cp: np.ndarray | None = None
+    cov: np.ndarray | None = None
+    cov_names: tuple[str, ...] = ()
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        x, ts, cp, cov, names = self.x, self.ts, self.cp, self.cov, self.cov_names
+        for i in range(len(x)):
+            tick: dict[str, Any] = {"x": float(x[i])}
+            if ts is not None:
+                tick["timestamp"] = ts[i]
+            if cov is not None:
+                tick["covariates"] = {
+                    c: v for c, v in zip(names, cov[i].tolist(), strict=True) if v == v
+                }
+            if cp is not None:
+                tick["cp"] = float(cp[i])
+            yield tick
+
+
+def materialize(ticks: Iterable[dict[str, Any]], covar_cols: Sequence[str] = ()) -> ArrayStream:
+    """
+    Drain a tick iterable (e.g. a Replay) once into an ArrayStream so repeated
+    backtests over it skip per-tick dict handling. Covariates listed in
+    `covar_cols` become columns of `cov` (NaN where a tick lacks them).
+    """
+    xs: list[float] = []
+    ts: list[Any] = []
+    cps: list[float] = []
+    covs: list[list[float]] = []
+    has_ts = has_cp = False
+    nan = float("nan")
+    for tick in ticks:
+        xs.append(float(tick["x"]))
+        t = tick.get("timestamp")
+        has_ts = has_ts or t is not None
+        ts.append(t)
+        c = tick.get("cp", tick.get("is_cp"))
+        has_cp = has_cp or c is not None
+        cps.append(float(c or 0.0))
+        if covar_cols:
+            cv = tick.get("covariates") or {}
+            covs.append([float(cv[k]) if k in cv else nan for k in covar_cols])
+    ts_arr = None
+    if has_ts:
+        ts_arr = np.empty(len(ts), dtype=object)
+        ts_arr[:] = ts
+    return ArrayStream(
+        x=np.asarray(xs, dtype=np.float64),
+        ts=ts_arr,
+        cp=np.asarray(cps, dtype=np.float64) if has_cp else None,
+        cov=np.asarray(covs, dtype=np.float64).reshape(len(xs), len(covar_cols)) if covar_cols else None,
+        cov_names=tuple(covar_cols),
+    )
+
+
 class Replay:
     """
     Stream historical ticks from CSV or Parquet.
@@ -45,6 +123,24 @@ class Replay:
         self.covar_cols = covar_cols or []
         self.batch_size = int(batch_size)
 
+    def materialize(self) -> ArrayStream:
+        """
+        Read the whole file once into columns (see `materialize`). Parsed
+        columns are cached per file version and options, so later Replays of
+        the same unchanged file share them (read-only) instead of re-parsing.
+        """
+        st = os.stat(self.path)
+        cached = _materialize_file(
+            os.path.abspath(self.path),
+            st.st_mtime_ns,
+            st.st_size,
+            self.ts_col,
+            self.y_col,
+            tuple(self.covar_cols),
+        )
+        # fresh wrapper over the shared columns
+        return dataclasses.replace(cached)
+
     def __iter__(self) -> Iterator[dict[str, Any]]:
         ext = os.path.splitext(self.path)[1].lower()
 
@@ -133,3 +229,15 @@ class Replay:
                 if cp_field is not None:
                     row_out["cp"] = _parse_boolish(r[cp_field])
                 yield row_out
+
+
+@functools.lru_cache(maxsize=4)
+def _materialize_file(
+    path: str, mtime_ns: int, size: int, ts_col: str, y_col: str, covar_cols: tuple[str, ...]
+) -> ArrayStream:
+    # mtime/size only key the cache: a rewritten file is parsed again
+    stream = materialize(Replay(path, ts_col, y_col, list(covar_cols)), covar_cols)
+    for col in (stream.x, stream.ts, stream.cp, stream.cov):
+        if col is not None:
+            col.flags.writeable = False
+    return stream
@@ -21,9 +21,9 @@ def _run_backtest(data: str, profile: str | None, config: str | None, alpha: flo
 
     pipe = Pipeline(cfg)
     runner = BacktestRunner(alpha=alpha, cp_tol=cp_tol)
-    stream = Replay(data, covar_cols=["rv", "ewm_vol", "ac1", "z"])
+    stream = Replay(data, covar_cols=["rv", "ewm_vol", "ac1", "z"]).materialize()
     metrics, log = runner.run(pipe, stream)
-    return metrics, pd.DataFrame(log)
+    return metrics, pd.DataFrame(log.columns())
 
 
 def _contiguous_ranges(mask: pd.Series) -> list[tuple[pd.Timestamp, pd.Timestamp]]:
@@ -55,10 +55,10 @@ def _run_backtest(data: str, profile: str | None, config: str | None, alpha: flo
 
     pipe = Pipeline(cfg)
     runner = BacktestRunner(alpha=alpha, cp_tol=cp_tol)
-    stream = Replay(data, covar_cols=["rv", "ewm_vol", "ac1", "z"])
+    stream = Replay(data, covar_cols=["rv", "ewm_vol", "ac1", "z"]).materialize()
     metrics, log = runner.run(pipe, stream)
 
-    df = pd.DataFrame(log)
+    df = pd.DataFrame(log.columns())
     df["t"] = pd.to_datetime(df["t"], utc=True, errors="coerce")
     df = df.dropna(subset=["t"]).set_index("t").sort_index()
     return metrics, df
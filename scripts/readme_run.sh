@@ -40,7 +40,7 @@ python scripts/service_smoke.py | tee artifacts/service_smoke.json
 
 if [[ "${RUN_SWEEP:-0}" = "1" ]]; then
   echo "[readme] Running a quick 50-combo sweep on synthetic data..."
-  python scripts/exp_sweep.py --data data/sim.csv --smoke 50 --out artifacts/sweep_sim.ndjson
+  python -m backtest.sweep --data data/sim.csv --smoke 50 --out artifacts/sweep_sim.ndjson
 else
   echo "[readme] Skipping sweep (set RUN_SWEEP=1 to enable)."
 fi
@@ -0,0 +1,85 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+from backtest.cli_server import serve
+from core.pipeline import Pipeline
+
+
+def test_pipeline_reset_matches_fresh():
+    xs = np.sin(np.arange(200) / 7.0)
+    used = Pipeline({})
+    for x in xs[:50]:
+        used.process_scalar(x)
+        used.update_truth(x)
+    used.reset()
+    fresh = Pipeline({})
+    for x in xs:
+        assert used.process_scalar(x) == fresh.process_scalar(x)
+        used.update_truth(x)
+        fresh.update_truth(x)
+
+
+def test_serve_answers_each_line(tmp_path):
+    data = tmp_path / "s.csv"
+    pd.DataFrame({"x": np.cos(np.arange(100) / 3.0)}).to_csv(data, index=False)
+    req = json.dumps({"data": str(data), "id": "a"})
+    inp = io.StringIO(f"{req}\n\n{req}\nnot json\n")
+    out = io.StringIO()
+    assert serve(inp, out, {"alpha": 0.1}) == 1
+    first, second, bad = (json.loads(line) for line in out.getvalue().splitlines())
+    assert first["id"] == "a"
+    assert first["n_points"] == 99
+    assert first["metrics"]["mae"] == second["metrics"]["mae"]
+    assert "error" in bad
+
+
+def test_dump_log_json_same_without_orjson(tmp_path, monkeypatch):
+    import sys
+
+    from backtest.cli import _dump_log
+    from backtest.runner import BacktestRunner
+    from data.replay import ArrayStream
+
+    x = np.sin(np.arange(40) / 3.0)
+    ts = np.arange(40, dtype=np.int64)
+    _, log = BacktestRunner(time_every=3).run(Pipeline({}), ArrayStream(x=x, ts=ts))
+    assert np.isnan(log.lat_total_ms).any()
+    _dump_log(log, tmp_path / "a.json")
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    _dump_log(log, tmp_path / "b.json")
+    a = json.loads((tmp_path / "a.json").read_text())
+    assert a == json.loads((tmp_path / "b.json").read_text())
+    assert a["t"] == ts[1:].tolist()
+    assert None in a["lat_total_ms"]
+
+
+def test_cached_pipeline_follows_config_edits(tmp_path):
+    import os
+
+    from backtest.cli_server import cached_pipeline
+
+    cfg = tmp_path / "c.yaml"
+    cfg.write_text("ewma_alpha: 0.1\n")
+    first = cached_pipeline(str(cfg), None)
+    assert cached_pipeline(str(cfg), None) is first
+    cfg.write_text("ewma_alpha: 0.25\n")
+    st = cfg.stat()
+    os.utime(cfg, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    edited = cached_pipeline(str(cfg), None)
+    assert edited is not first
+    assert edited.cfg["ewma_alpha"] == 0.25
+
+
+def test_json_line_same_without_orjson(monkeypatch):
+    import sys
+
+    from backtest.cli_server import _json_line
+
+    res = {"metrics": {"mae": 0.5, "cp_delay_mean": float("nan")}, "n_points": 3, "id": "a"}
+    with_orjson = json.loads(_json_line(res))
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    assert json.loads(_json_line(res)) == with_orjson
+    assert with_orjson["metrics"]["cp_delay_mean"] is None
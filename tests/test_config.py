@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import os
+
+from core.config import load_config
+
+
+def test_load_config_rereads_changed_file_and_returns_copies(tmp_path):
+    p = tmp_path / "c.yaml"
+    p.write_text("ewma_alpha: 0.1\ndetector:\n  vol_threshold: 0.02\n", encoding="utf-8")
+    a = load_config(p)
+    a["ewma_alpha"] = 99.0
+    a["detector"]["vol_threshold"] = 1.0
+    b = load_config(p)
+    assert b["ewma_alpha"] == 0.1
+    assert b["detector"]["vol_threshold"] == 0.02
+    assert b["regime_vol_threshold"] == 0.02
+
+    p.write_text("ewma_alpha: 0.3\n", encoding="utf-8")
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert load_config(p) == {"ewma_alpha": 0.3}
+
+
+def test_load_config_writes_no_cache_files(tmp_path):
+    p = tmp_path / "c.yaml"
+    p.write_text("conformal_q: 0.8\n", encoding="utf-8")
+    assert load_config(p) == {"conformal_q": 0.8}
+    assert load_config(p) == {"conformal_q": 0.8}
+    assert [q.name for q in tmp_path.iterdir()] == ["c.yaml"]
@@ -20,3 +20,184 @@ def test_online_conformal_coverage_stationary():
     n = len(y) - warm
     cover = hits / max(1, n)
     assert abs(cover - (1 - alpha)) <= 0.08  # loose bound for small-sample online behavior
+
+
+def test_quantile_helpers_match_sorted_reference():
+    from math import ceil
+
+    from core.conformal import _unweighted_quantile_strict, _weighted_quantile
+
+    rng = random.Random(2)
+    for _ in range(200):
+        n = rng.randint(1, 40)
+        vals = [rng.choice([0.5, 1.0, rng.random()]) for _ in range(n)]
+        wts = [rng.choice([0.0, 1.0, rng.random()]) for _ in range(n)]
+        q = rng.random()
+        s = sorted(vals)
+        assert _unweighted_quantile_strict(vals, q) == s[max(1, min(ceil((n + 1) * q), n)) - 1]
+        pairs = sorted((v, w) for v, w in zip(vals, wts, strict=True) if w > 0.0)
+        acc, want = 0.0, (pairs[-1][0] if pairs else 0.0)
+        for v, w in pairs:
+            acc += w
+            if acc >= q * sum(w for _, w in pairs):
+                want = v
+                break
+        assert _weighted_quantile(vals, wts, q) == want
+        assert _unweighted_quantile_strict(vals, 0.0) == s[0]
+        assert _unweighted_quantile_strict(vals, 1.0) == s[-1]
+
+
+def test_decay_weights_are_derived_from_age():
+    oc = OnlineConformal(window=3, decay=0.5, by_regime=True)
+    for y in (1.0, 2.0, 3.0, 4.0):
+        oc.update(0.0, y, "calm")
+    oc.update(0.0, 5.0, "volatile")
+    # window keeps the last three; the newest entry always weighs 1.0
+    assert list(oc.res_global) == [3.0, 4.0, 5.0]
+    assert oc._global.weights(0.5).tolist() == [0.25, 0.5, 1.0]
+    assert oc._by_regime["calm"].weights(0.5).tolist() == [0.25, 0.5, 1.0]
+    assert oc._by_regime["volatile"].weights(0.5).tolist() == [1.0]
+
+
+def test_sorted_window_tracks_evictions():
+    from core.conformal import _DecayBuffer
+
+    rng = random.Random(4)
+    buf = _DecayBuffer(25, keep_sorted=True)
+    for _ in range(500):
+        buf.append(rng.choice([0.5, 1.0, rng.random()]))
+        assert buf.sorted == sorted(buf.res.tolist())
+    buf.append(float("nan"))
+    assert buf.n_nan == 1
+    assert len(buf.sorted) == 24
+
+
+def test_multi_alpha_matches_single_alpha_calls():
+    rng = random.Random(6)
+    alphas = [0.0, 0.05, 0.1, 0.5, 1.0]
+    for kw in ({"decay": 0.95}, {"decay": 1.0, "by_regime": True}, {"decay": 0.9, "min_eff_n": 500}):
+        oc = OnlineConformal(window=200, **kw)
+        for _ in range(300):
+            oc.update(0.0, rng.gauss(0.0, 1.0), "calm")
+        multi = oc.interval(0.0, regime_label="calm", alphas_multi=alphas)
+        for a in alphas:
+            assert multi[f"alpha={a:.2f}"] == oc.interval(0.0, alpha=a, regime_label="calm")
+
+
+def test_weighted_quantile_kernel_matches_numpy_path():
+    # without numba the kernel runs as plain Python; it must agree either way
+    import numpy as np
+
+    from core import _kernels
+    from core.conformal import _weighted_quantiles
+
+    rng = np.random.default_rng(8)
+    qs = [0.0, 0.1, 0.5, 0.9, 1.0]
+    for n in (0, 1, 2, 17, 200):
+        vals = rng.choice([0.5, 1.0, 2.0], size=n) + rng.random(n) * (rng.random() < 0.5)
+        wts = rng.choice([0.0, 1.0, 0.3], size=n) * rng.random(n)
+        got = _kernels.weighted_quantiles(vals, wts, np.array(qs)).tolist()
+        assert got == _weighted_quantiles(vals, wts, qs)
+
+
+def test_closed_form_effective_n_matches_weights():
+    import math
+
+    from core.conformal import _DecayBuffer, _effective_n
+
+    buf = _DecayBuffer(50)
+    assert buf.effective_n(0.9) == 0.0
+    for i in range(120):
+        buf.append(float(i))
+        for d in (0.5, 0.9, 0.999, 1.0):
+            assert math.isclose(buf.effective_n(d), _effective_n(buf.weights(d)), rel_tol=1e-12)
+
+
+def test_interval_memo_is_reset_by_updates():
+    oc = OnlineConformal(window=50, decay=0.95, by_regime=True, min_eff_n=5)
+    rng = random.Random(2)
+    for i in range(80):
+        oc.update(0.0, rng.gauss(0.0, 1.0), "calm" if i % 3 else "volatile")
+    first = oc.interval(0.0, 0.1, "calm")
+    assert oc.interval(0.0, 0.1, "calm") == first
+    assert oc._by_regime["calm"].memo
+    assert oc._global.memo
+    oc.update(0.0, 100.0, "calm")
+    assert not oc._by_regime["calm"].memo
+    assert oc.interval(0.0, 0.1, "calm") != first
+
+
+def test_pipeline_buffer_percentile_matches_sorted():
+    from collections import deque
+
+    from core.pipeline import _SELECT_MIN, _buffer_percentile, _percentile
+
+    rng = random.Random(9)
+    for n in (1, 5, _SELECT_MIN - 1, _SELECT_MIN, 2000):
+        buf = deque(abs(rng.gauss(0.0, 1.0)) for _ in range(n))
+        for q in (0.0, 0.5, 0.9, 1.0):
+            assert _buffer_percentile(buf, q) == _percentile(sorted(buf), q)
+
+
+def test_pipeline_sorted_window_matches_deque():
+    from collections import deque
+
+    from core.pipeline import Pipeline, _percentile, _SortedWindow
+
+    rng = random.Random(5)
+    win, ref = _SortedWindow(40), deque(maxlen=40)
+    for i in range(300):
+        r = float("nan") if i == 150 else rng.choice([0.5, rng.random()])
+        win.append(r)
+        ref.append(r)
+        assert list(win) == list(ref)
+        if win.n_nan == 0:
+            assert win.sorted == sorted(ref)
+            assert win.percentile(0.9) == _percentile(sorted(ref), 0.9)
+
+    pipe = Pipeline({"conformal_maxlen": 50})
+    for i in range(120):
+        pipe.process_scalar(0.01 * (i % 7))
+        pipe.update_truth(0.02 * (i % 5))
+    pipe.reconfigure(conformal_maxlen=20)
+    assert pipe.global_res.sorted == sorted(pipe.global_res)
+    assert len(pipe.global_res) == 20
+    again = Pipeline.from_state({"conformal_maxlen": 20}, pipe.state_dict())
+    assert again.global_res.sorted == pipe.global_res.sorted
+    assert again.regime_res["calm"].sorted == pipe.regime_res["calm"].sorted
+
+
+def test_pipeline_interval_keys_follow_q():
+    from core.pipeline import Pipeline
+
+    pipe = Pipeline({"conformal_q": 0.9})
+    assert set(pipe.process_scalar(0.1)["intervals"]) == {"alpha=0.10", "90"}
+    pipe.reconfigure(conformal_q=0.8)
+    assert set(pipe.process_scalar(0.1)["intervals"]) == {"alpha=0.20", "80"}
+
+
+def test_pipeline_window_bulk_load_matches_appends():
+    from core.pipeline import _SortedWindow
+
+    vals = [0.3, float("nan"), 0.1, 0.7, 0.2, 0.5]
+    bulk = _SortedWindow(4, vals)
+    one_by_one = _SortedWindow(4)
+    for v in vals:
+        one_by_one.append(v)
+    assert list(bulk) == list(one_by_one) == vals[2:]
+    assert bulk.sorted == one_by_one.sorted == [0.1, 0.2, 0.5, 0.7]
+    assert bulk.n_nan == one_by_one.n_nan == 0
+    assert _SortedWindow(4, vals[:3]).n_nan == 1
+
+
+def test_decay_above_one_means_uniform_weights():
+    a = OnlineConformal(window=600, decay=1.5)
+    b = OnlineConformal(window=600, decay=1.0)
+    rng = random.Random(8)
+    for _ in range(500):
+        y = rng.gauss(0.0, 1.0)
+        a.update(0.0, y)
+        b.update(0.0, y)
+    assert a._global.weights(1.5).tolist() == [1.0] * 500
+    assert a._global.effective_n(1.5) == 500.0
+    assert a.interval(0.0, alpha=0.1) == b.interval(0.0, alpha=0.1)
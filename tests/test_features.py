@@ -11,3 +11,51 @@ def test_features_stream_constant():
         assert abs(out["z"]) < 1e-9
         assert out["ewm_vol"] >= 0.0
         assert out["rv"] >= 0.0
+
+
+def test_update_scalar_matches_dict_update():
+    a = FeatureExtractor(ewm_alpha=0.3, min_warmup=3)
+    b = FeatureExtractor(ewm_alpha=0.3, min_warmup=3)
+    for x in (0.5, -1.0, 2.0, 0.0, 0.25):
+        out = a.update(x)
+        assert b.update_scalar(x) == (out["ewm_mean"], out["ewm_var"], out["ewm_std"], out["z"], out["warmup"])
+
+
+def test_update_many_matches_per_tick_updates():
+    import numpy as np
+
+    from core import _kernels
+
+    xs = np.sin(np.arange(60) / 3.0) + np.where(np.arange(60) % 7 == 0, 1.5, 0.0)
+    xs[5] = np.nan
+    a = FeatureExtractor(ewm_alpha=0.2, min_warmup=10)
+    a.update(0.3)
+    b = FeatureExtractor(ewm_alpha=0.2, min_warmup=10)
+    b.update(0.3)
+    singles = [a.update(float(v)) for v in xs[:40]]
+    batch = b.update_many(xs[:40])
+    for k in ("ewm_mean", "ewm_var", "ewm_std", "z", "warmup", "rv"):
+        assert batch[k].tolist() == [o[k] for o in singles]
+    # state carries over, and the kernel (compiled or not) agrees with the loop
+    assert b.update_many(xs[40:])["ewm_mean"].tolist() == [a.update(float(v))["ewm_mean"] for v in xs[40:]]
+    m, _ = _kernels.ewma_moments(np.nan_to_num(xs, nan=0.0), 0.0, 0.0, 0.2)
+    fresh = FeatureExtractor(ewm_alpha=0.2).update_many(xs)
+    assert m.tolist() == fresh["ewm_mean"].tolist()
+
+
+def test_update_rv_from_covariates_or_variance():
+    fe = FeatureExtractor(ewm_alpha=0.5)
+    assert fe.update({"x": 1.0, "covariates": {"rv": 0.04}})["rv"] == 0.04
+    out = fe.update({"x": 2.0, "covariates": {"rv": None}})
+    assert out["rv"] == out["ewm_var"]
+    out = fe.update(3.0)
+    assert out["rv"] == out["ewm_var"]
+
+
+def test_update_fast_paths_agree():
+    import numpy as np
+
+    a, b, c = FeatureExtractor(ewm_alpha=0.4), FeatureExtractor(ewm_alpha=0.4), FeatureExtractor(ewm_alpha=0.4)
+    for x in (0.5, float("nan"), np.float64(2.0), 1, -0.25):
+        clean = 0.0 if x != x else float(x)
+        assert a.update(x) == b.update({"x": x}) == c.update_x(clean)
@@ -0,0 +1,180 @@
+import math
+
+import numpy as np
+
+from backtest.metrics import coverage, mae, rmse, smape
+
+
+def test_point_metrics_truncate_to_shortest():
+    y = [0.0, 1.0, -2.0, 5.0]
+    yhat = [0.5, 1.0, -1.0]  # last truth has no prediction
+    assert math.isclose(mae(y, yhat), 0.5)
+    assert math.isclose(rmse(y, yhat), math.sqrt(1.25 / 3))
+    # sMAPE: sum|f-a| / (sum(|a|+|f|)/2)
+    assert math.isclose(smape(y, yhat), 1.5 / (5.5 / 2.0) * 100.0)
+    assert math.isclose(coverage(y, [-1.0, 0.0, -1.5], [1.0, 0.5, 0.0]), 1 / 3)
+
+
+def test_point_metrics_empty_and_arrays():
+    assert math.isnan(mae([], []))
+    assert math.isnan(rmse(np.array([]), np.array([])))
+    assert smape([0.0], [0.0]) == 0.0
+    assert coverage([], [], []) == 0.0
+    a = np.array([1.0, 2.0, 3.0])
+    assert mae(a, a) == 0.0
+    assert coverage(a, a, a) == 1.0
+
+
+def test_kernels_match_reference():
+    # without numba the kernels run as plain Python; they must agree either way
+    from backtest import _kernels
+    from backtest.metrics import _match_events, _pred_indices_from_scores
+
+    rng = np.random.default_rng(0)
+    scores = (rng.random(500) > 0.8).astype(float)
+    for cooldown, mc in ((0, 1), (3, 1), (2, 3), (5, 2)):
+        want = _pred_indices_from_scores(scores, 0.5, cooldown, mc)
+        assert _kernels.pred_indices(scores, 0.5, cooldown, mc).tolist() == want
+
+    true_idx = [3, 10, 11, 40, 90]
+    pred_idx = [1, 9, 12, 13, 60, 95]
+    tp, fp, fn, delays = _kernels.match_events(np.array(true_idx), np.array(pred_idx), 5)
+    assert (tp, fp, fn, delays.tolist()) == _match_events(true_idx, pred_idx, 5)
+
+
+def test_p2_estimator_tracks_quantiles():
+    from backtest.metrics import P2Estimator, latency_p50_p95
+
+    small = P2Estimator(0.5)
+    for v in (3.0, 1.0, 2.0):
+        small.add(v)
+    assert small.value() == 2.0
+    assert P2Estimator(0.95).value() == 0.0
+
+    xs = np.random.default_rng(0).exponential(1.0, 20_000)
+    p50, p95 = P2Estimator(0.5), P2Estimator(0.95)
+    for v in xs:
+        p50.add(v)
+        p95.add(v)
+    exact = latency_p50_p95(xs)
+    assert math.isclose(p50.value(), exact["p50"], rel_tol=0.02)
+    assert math.isclose(p95.value(), exact["p95"], rel_tol=0.02)
+
+
+def test_backtest_log_rows_and_columns():
+    from backtest.runner import BacktestRunner
+    from core.pipeline import Pipeline
+    from data.replay import ArrayStream
+
+    x = np.sin(np.arange(50) / 5.0)
+    m, log = BacktestRunner().run(Pipeline({}), ArrayStream(x=x))
+    assert len(log) == 49
+    rows = list(log)
+    assert rows[0]["y"] == x[1]
+    assert rows[-1] == log[-1]
+    assert set(log.columns()) == set(rows[0])
+    assert math.isclose(m["mae"], float(np.mean(np.abs(log.y - log.y_hat))))
+
+
+def test_point_metrics_threaded_matches_serial(monkeypatch):
+    from backtest import metrics
+
+    rng = np.random.default_rng(3)
+    y, f = rng.normal(size=1000), rng.normal(size=1000)
+    lo, hi = f - 0.5, f + 0.5
+    serial = metrics.point_metrics(y, f, lo, hi)
+    monkeypatch.setattr(metrics, "PARALLEL_MIN_POINTS", 1)
+    assert metrics.point_metrics(y, f, lo, hi) == serial
+    assert serial["mae"] == mae(y, f)
+
+
+def test_runner_unsized_stream_grows_buffers():
+    from backtest.runner import BacktestRunner
+    from core.pipeline import Pipeline
+    from data.replay import ArrayStream
+
+    x = np.cos(np.arange(3000) / 11.0)
+    m_sized, log_sized = BacktestRunner(exact_latency=True).run(Pipeline({}), ArrayStream(x=x))
+    m_gen, log_gen = BacktestRunner(exact_latency=True).run(
+        Pipeline({}), ({"x": v} for v in x)
+    )
+    assert len(log_gen) == len(log_sized) == 2999
+    assert np.array_equal(log_gen.y_hat, log_sized.y_hat)
+    assert m_gen["mae"] == m_sized["mae"]
+
+
+def test_bound_extractors_agree_with_generic():
+    from backtest.runner import (
+        _bind_extractors,
+        _extract_intervals,
+        _extract_latency_ms,
+        _extract_yhat,
+    )
+
+    preds = [
+        {"y_hat": 1.0, "interval_low": 0.0, "interval_high": 2.0},
+        {"yhat": 1.0, "intervals": {"alpha=0.10": [0.0, 3.0]}},
+        {"y": 2.0, "intervals": {"90": [1.0, 2.0]}, "latency_ms": {"total_ms": 3.0}},
+        {"prediction": 5.0, "latency_ms": 4.0},
+    ]
+    for first in preds:
+        get_yhat, get_iv, get_lat = _bind_extractors(first, 0.1)
+        for p in preds:
+            assert get_yhat(p) == _extract_yhat(p)
+            assert get_iv(p) == _extract_intervals(p, 0.1)
+            assert get_lat(p) == _extract_latency_ms(p)
+
+
+def test_runner_without_log_keeps_metrics():
+    from backtest.runner import BacktestRunner
+    from core.pipeline import Pipeline
+    from data.replay import ArrayStream
+
+    x = np.sin(np.arange(2000) / 7.0)
+    cp = (np.arange(2000) % 400 == 0).astype(np.float64)
+    drop = {"latency_p50_ms", "latency_p95_ms"}
+    for stream in (lambda: ArrayStream(x=x, cp=cp), lambda: ({"x": a, "cp": c} for a, c in zip(x, cp, strict=True))):
+        m_full, log_full = BacktestRunner().run(Pipeline({}), stream())
+        m_lean, log_lean = BacktestRunner().run(Pipeline({}), stream(), build_log=False)
+        keys = sorted(set(m_full) - drop)
+        assert sorted(set(m_lean) - drop) == keys
+        assert np.array_equal([m_lean[k] for k in keys], [m_full[k] for k in keys], equal_nan=True)
+        assert len(log_lean) == len(log_full)
+        assert np.isnan(log_lean.cp_prob).all()
+
+
+def test_latency_quantiles_in_place_match_copy():
+    from backtest.metrics import latency_p50_p95
+
+    lat = np.random.default_rng(3).exponential(size=1001)
+    expected = {"p50": float(np.sort(lat)[500]), "p95": float(np.sort(lat)[950])}
+    assert latency_p50_p95(lat) == expected
+    assert latency_p50_p95(lat.copy(), overwrite_input=True) == expected
+
+
+def test_runner_samples_latency_every_k():
+    from backtest.runner import BacktestRunner
+    from core.pipeline import Pipeline
+    from data.replay import ArrayStream
+
+    x = np.sin(np.arange(1001) / 7.0)
+    m_all, _ = BacktestRunner(exact_latency=True).run(Pipeline({}), ArrayStream(x=x))
+    m_k, log = BacktestRunner(exact_latency=True, time_every=4).run(Pipeline({}), ArrayStream(x=x))
+    # row i carries tick i's latency; ticks 0, 4, 8, ... are timed
+    timed = ~np.isnan(log.lat_total_ms)
+    assert np.array_equal(np.flatnonzero(timed), np.arange(0, 1000, 4))
+    assert m_k["latency_p95_ms"] > 0.0
+    assert m_k["mae"] == m_all["mae"]
+
+
+def test_runner_latency_exact_by_default():
+    from backtest.runner import BacktestRunner
+    from core.pipeline import Pipeline
+    from data.replay import ArrayStream
+
+    x = np.sin(np.arange(200) / 7.0)
+    m, _ = BacktestRunner().run(Pipeline({}), ArrayStream(x=x))
+    assert "latency_approx" not in m
+    m_p2, _ = BacktestRunner(exact_latency=False).run(Pipeline({}), ArrayStream(x=x))
+    assert m_p2["latency_approx"] == 1.0
+    assert m_p2["mae"] == m["mae"]
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from backtest import sweep
+from backtest.runner import BacktestRunner
+from core.pipeline import Pipeline
+from data.replay import ArrayStream
+
+
+def test_reused_pipeline_matches_fresh(tmp_path):
+    x = np.sin(np.arange(300) / 9.0) * 0.05
+    data = tmp_path / "s.csv"
+    pd.DataFrame({"x": x}).to_csv(data, index=False)
+    grid = {"alpha": [0.1], "ewma_alpha": [0.05, 0.3], "regime_vol_threshold": [0.01, 0.05]}
+    results = list(sweep.run_sweep(str(data), grid))
+    x = pd.read_csv(data)["x"].to_numpy()  # what the sweep actually saw
+    assert len(results) == 4
+    assert len(sweep._PIPE_CACHE) == 1
+    for res in results:
+        cfg = {
+            "conformal_q": 0.9,
+            "ewma_alpha": res["ewma_alpha"],
+            "regime_vol_threshold": res["regime_vol_threshold"],
+        }
+        m, _ = BacktestRunner(alpha=0.1).run(Pipeline(cfg), ArrayStream(x=x))
+        assert m["mae"] == res["metrics"]["mae"]
+        assert m["coverage"] == res["metrics"]["coverage"]
+
+
+def test_prune_keeps_best_on_truncated_pass(tmp_path):
+    import json
+
+    data = tmp_path / "p.csv"
+    pd.DataFrame({"x": np.sin(np.arange(400) / 5.0) * 0.03}).to_csv(data, index=False)
+    grid = {"alpha": [0.1, 0.2], "ewma_alpha": [0.05, 0.2, 0.5]}
+    full = [json.loads(line) for blob in sweep.sweep_ndjson(str(data), grid) for line in blob.splitlines()]
+    kept = [
+        json.loads(line)
+        for blob in sweep.sweep_ndjson(str(data), grid, prune_top=2, prune_rows=None, batch_size=4)
+        for line in blob.splitlines()
+    ]
+    # with the full stream as the pruning pass, survivors are the two best full runs
+    best = sorted(full, key=sweep.prune_score)[:2]
+    assert sorted(map(sweep.prune_score, kept)) == sorted(map(sweep.prune_score, best))
+    assert all(r["n_points"] == 399 for r in kept)
+
+
+def test_spilled_columns_map_back(tmp_path):
+    ts = np.arange(50, dtype=np.int64) * 1_000_000_000
+    stream = ArrayStream(
+        x=np.linspace(0, 1, 50), ts=ts, cp=np.zeros(50), cov=np.ones((50, 2)), cov_names=("a", "b")
+    )
+    sweep._setup_mapped(sweep._spill(stream, str(tmp_path)), {"min_warmup": 5})
+    mapped = sweep._STREAM
+    assert mapped is not None
+    assert isinstance(mapped.x, np.memmap)
+    assert not mapped.x.flags.writeable
+    for name in ("x", "ts", "cp", "cov"):
+        assert np.array_equal(getattr(mapped, name), getattr(stream, name))
+    assert mapped.cov_names == ("a", "b")
+    assert sweep._BASE_CFG == {"min_warmup": 5}
+
+
+def test_parse_cpulist():
+    assert sweep._parse_cpulist("0-3,8,10-11\n") == {0, 1, 2, 3, 8, 10, 11}
+    assert sweep._parse_cpulist("") == set()
+
+
+def test_sampled_combos_match_sampling_the_product():
+    import random
+
+    grid = {"a": [1, 2, 3], "b": ["x", "y"], "c": [0.1, 0.2, 0.3, 0.4]}
+    full = sweep.combos(grid)
+    assert [sweep._combo_at(grid, i) for i in range(len(full))] == full
+    assert sweep._select(grid, 5, seed=7) == random.Random(7).sample(full, 5)
+    assert sweep._select(grid, 99, seed=7) == full
+
+
+def test_output_does_not_depend_on_workers(tmp_path, monkeypatch):
+    data = tmp_path / "w.csv"
+    pd.DataFrame({"x": np.sin(np.arange(300) / 7.0) * 0.04}).to_csv(data, index=False)
+    grid = {"alpha": [0.1, 0.2], "ewma_alpha": [0.05, 0.2], "cp_threshold": [0.3, 0.7]}
+    # let the pool start even on a single-CPU runner
+    monkeypatch.setattr(sweep, "available_cpus", lambda: 2)
+    runs = [
+        b"".join(sweep.sweep_ndjson(str(data), grid, workers=w, batch_size=b, prune_top=p, prune_rows=100))
+        for w, b, p in ((1, 32, None), (2, 3, None), (1, 32, 5), (2, 2, 5))
+    ]
+    assert runs[0] == runs[1]
+    assert runs[2] == runs[3]
+    assert b"latency" not in runs[0]
+
+
+def test_ndjson_line_same_without_orjson(monkeypatch):
+    import sys
+
+    rec = {"alpha": 0.1, "metrics": {"mae": 0.5, "cp_precision": float("nan")}, "n_points": 3}
+    with_orjson = sweep._ndjson_line(rec)
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    fallback = sweep._ndjson_line(rec)
+    assert fallback == b'{"alpha":0.1,"metrics":{"mae":0.5,"cp_precision":null},"n_points":3}\n'
+    assert fallback == with_orjson
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.tick_cache import open_binary, to_binary
+
+
+def test_roundtrip(tmp_path):
+    df = pd.DataFrame(
+        {
+            "timestamp": ["2024-01-01T00:00:00Z", "2024-01-01T01:00:00Z", "2024-01-03T00:00:00Z"],
+            "x": [0.1, -0.25, 3.5],
+            "cp": ["0", "1", "junk"],
+        }
+    )
+    s = open_binary(to_binary(df, tmp_path / "t.tvc"))
+    assert len(s) == 3
+    assert np.array_equal(s.x, df["x"].to_numpy())
+    assert s.cp is not None
+    assert s.cp.tolist() == [0.0, 1.0, 0.0]
+    assert s.ts is not None
+    assert s.ts.tolist() == df["timestamp"].tolist()
+
+
+def test_wide_gaps_and_no_optional_columns(tmp_path):
+    ts = pd.to_datetime(["2000-01-01", "2024-01-01"])
+    s = open_binary(to_binary(pd.DataFrame({"timestamp": ts, "x": [1.0, 2.0]}), tmp_path / "w.tvc"))
+    assert s.ts is not None
+    assert s.ts[1] == np.datetime64("2024-01-01", "ns")
+    assert s.cp is None
+    s = open_binary(to_binary(pd.DataFrame({"timestamp": [5, 3], "x": [1.0, 2.0]}), tmp_path / "i.tvc"))
+    assert s.ts is not None
+    assert s.ts.tolist() == [5, 3]
+    s = open_binary(to_binary(pd.DataFrame({"x": [1.0]}), tmp_path / "x.tvc"))
+    assert s.ts is None
+    assert s.x.tolist() == [1.0]
+
+
+def test_materialize_replay_roundtrip(tmp_path):
+    from data.replay import Replay
+
+    path = tmp_path / "r.csv"
+    pd.DataFrame(
+        {
+            "timestamp": ["2024-01-01T00:00:00Z", "2024-01-01T01:00:00Z"],
+            "x": [0.5, -1.0],
+            "rv": [None, 0.25],
+            "cp": [0, 1],
+        }
+    ).to_csv(path, index=False)
+    replay = Replay(str(path), covar_cols=["rv"])
+    stream = replay.materialize()
+    assert stream.cov is not None
+    assert stream.cov.shape == (2, 1)
+    assert list(stream) == list(replay)
+    # a second Replay of the unchanged file shares the parsed columns
+    again = Replay(str(path), covar_cols=["rv"]).materialize()
+    assert again is not stream
+    assert again.x is stream.x
+    assert not again.x.flags.writeable
+    assert Replay(str(path)).materialize().cov is None
+
+
+def test_cached_stream_matches_uncached(tmp_path):
+    from backtest.cli import _build_stream
+
+    path = tmp_path / "d.csv"
+    pd.DataFrame(
+        {
+            "timestamp": ["2024-01-01T00:00:00Z", "2024-01-01T00:00:01Z", "2024-01-02T00:00:00Z"],
+            "x": [0.1, -0.2, 0.3],
+            "cp": [0.0, 2.0, "junk"],
+        }
+    ).to_csv(path, index=False)
+    cache = tmp_path / "d.tvc"
+    plain = list(_build_stream(str(path)))
+    assert not cache.exists()
+    assert list(_build_stream(str(path), str(cache))) == plain
+    assert list(_build_stream(str(path), str(cache))) == plain  # mapped from the cache
+
+
+def test_unstorable_timestamps_are_not_cached(tmp_path):
+    from backtest.cli import _build_stream
+
+    path = tmp_path / "n.csv"
+    pd.DataFrame({"timestamp": [10.5, 11.25], "x": [1.0, 2.0]}).to_csv(path, index=False)
+    cache = tmp_path / "n.tvc"
+    assert list(_build_stream(str(path), str(cache))) == list(_build_stream(str(path)))
+    assert not cache.exists()
+
+
+def test_missing_data_file_ignores_cache(tmp_path):
+    from backtest.cli import _build_stream
+
+    path = tmp_path / "gone.csv"
+    pd.DataFrame({"x": [1.0]}).to_csv(path, index=False)
+    cache = tmp_path / "gone.tvc"
+    _build_stream(str(path), str(cache))
+    path.unlink()
+    with pytest.raises(FileNotFoundError):
+        _build_stream(str(path), str(cache))
+
+
+def test_log_keeps_original_timestamps(tmp_path):
+    from backtest.cli import _build_stream
+    from backtest.runner import BacktestRunner
+
+    class Last:
+        def process(self, tick):
+            return {"y_hat": tick["x"]}
+
+    path = tmp_path / "s.csv"
+    stamps = ["2024-01-01 09:30", "2024-01-01 09:31", "not a time"]
+    pd.DataFrame({"timestamp": stamps, "x": [1.0, 2.0, 3.0]}).to_csv(path, index=False)
+    for cache in (None, str(tmp_path / "s.tvc")):
+        _, log = BacktestRunner().run(Last(), _build_stream(str(path), cache))
+        assert log.t.tolist() == stamps[1:]
+
+
+def test_cache_is_rebuilt_for_a_different_source(tmp_path):
+    import os
+
+    from backtest.cli import _build_stream
+
+    first, other = tmp_path / "first.csv", tmp_path / "other.csv"
+    pd.DataFrame({"x": [1.0, 2.0, 3.0]}).to_csv(first, index=False)
+    pd.DataFrame({"x": [7.0, 8.0, 9.0]}).to_csv(other, index=False)
+    # other.csv is older than the cache, so an mtime check alone would reuse it
+    os.utime(other, ns=(1_000_000_000, 1_000_000_000))
+    cache = tmp_path / "c.tvc"
+    assert [t["x"] for t in _build_stream(str(first), str(cache))] == [1.0, 2.0, 3.0]
+    assert [t["x"] for t in _build_stream(str(other), str(cache))] == [7.0, 8.0, 9.0]
+    assert [t["x"] for t in _build_stream(str(first), str(cache))] == [1.0, 2.0, 3.0]
+
+
+def test_string_timestamps_stored_as_gaps(tmp_path):
+    n = 1000
+    stamps = pd.date_range("2024-01-01", periods=n, freq="h").strftime("%Y-%m-%dT%H:%M:%SZ")
+    df = pd.DataFrame({"timestamp": stamps, "x": np.arange(n, dtype=float), "cp": np.arange(n) % 2})
+    path = to_binary(df, tmp_path / "h.tvc")
+    # header + format, x as float64, hourly gaps as int32, cp as one byte per tick
+    assert path.stat().st_size <= 128 + n * 8 + (n - 1) * 4 + n
+    s = open_binary(path)
+    assert s.ts is not None
+    assert s.ts.tolist() == list(stamps)
+    assert s.cp is not None
+    assert s.cp.tolist() == (np.arange(n) % 2).tolist()
+
+
+def test_log_columns_are_writable_copies(tmp_path):
+    from backtest.runner import BacktestRunner
+    from core.pipeline import Pipeline
+    from data.replay import Replay
+
+    path = tmp_path / "w.csv"
+    stamps = ["2024-01-01T00:00:00Z", "2024-01-01T01:00:00Z", "2024-01-01T02:00:00Z"]
+    pd.DataFrame({"timestamp": stamps, "x": [0.1, 0.2, 0.3]}).to_csv(path, index=False)
+    stream = Replay(str(path)).materialize()
+    _, log = BacktestRunner().run(Pipeline({}), stream)
+    log.t[0] = "edited"
+    assert Replay(str(path)).materialize().ts.tolist() == stamps